@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
 from datetime import datetime
+from screener_rules import apply_rule_set
 
 # Today's date formats
 today_fmt = datetime.today().strftime("%m-%d-%Y")
@@ -15,18 +17,10 @@ top100_csv = f"{base_folder}/top-100-stocks-to-buy-{today_fmt}.csv"
 # Load workbook
 wb = load_workbook(excel_path, data_only=True)
 
-# Filter logic
+# Filter logic: the "stocks_excel_buy" rule set in screener_rules.json
+# (Medium and Long Term contain 'Buy', Short Term 'Buy' or 'Hold', Analysts >= 20)
 def filter_stocks(df):
-    # Include rows where:
-    # - Medium and Long Term contain 'Buy'
-    # - Short Term is either 'Buy' or 'Hold'
-    # - Analysts >= 20
-    return df[
-        (df["Medium Term"].str.contains("Buy", case=False, na=False)) &
-        (df["Long Term"].str.contains("Buy", case=False, na=False)) &
-        (df["Short Term"].str.contains("Buy|Hold", case=False, na=False)) &
-        (pd.to_numeric(df["# Analysts"], errors="coerce") >= 20)
-    ]
+    return apply_rule_set(df, "stocks_excel_buy")
 
 volume_df = pd.read_csv(volume_csv)
 top100_df = pd.read_csv(top100_csv)
@@ -54,82 +48,61 @@ def extract_headers(ws):
 def normalize(symbol):
     return str(symbol).strip().upper() if symbol else ""
 
-# Match and print comparison only
+# Screener rows indexed by normalized symbol (first row per symbol wins)
+def index_screener(filtered_df):
+    screener = filtered_df.assign(Symbol=filtered_df["Symbol"].astype(str).str.strip().str.upper())
+    return screener.drop_duplicates("Symbol").set_index("Symbol")
 
-def analyze_sheet(ws, filtered_tickers, filtered_df):
-    headers = extract_headers(ws)
+# Symbols of unsold holdings in a sheet (rows without a selling price)
+def unsold_symbols(ws, headers):
     symbol_col = headers["SYMBOL"]
     selling_price_col = headers["Selling Price"]
-
-    # Build set of existing unsold tickers
-    existing_unsold = set()
-    hold_only_symbols = set()
-    for row in ws.iter_rows(min_row=6, max_row=ws.max_row):
-        symbol_val = row[symbol_col - 1].value
-        selling_val = row[selling_price_col - 1].value
-        if symbol_val:
-            symbol_clean = str(symbol_val).strip().upper()
-            if selling_val is None or str(selling_val).strip() == "":
-                existing_unsold.add(symbol_clean)
-
-    # Create lookup of short term ratings from filtered data
-    filtered_lookup = {str(row["Symbol"]).strip().upper(): row["Short Term"] for _, row in filtered_df.iterrows()}
-
-    # Filter logic based on HOLD status rules
-    to_add = []
-    to_remove = []
-    to_hold = []
-    for ticker in filtered_tickers:
-        rating = filtered_lookup.get(ticker, "")
-        if ticker in existing_unsold:
-            if rating.lower() == "hold":
-                to_hold.append(ticker)
-            else:
-                to_hold.append(ticker)
-        else:
-            if rating.lower() != "hold":
-                to_add.append(ticker)
-
-    for ticker in existing_unsold:
-        if ticker not in filtered_tickers:
-            rating = filtered_lookup.get(ticker, "")
-            if rating.lower() != "hold":
-                to_remove.append(ticker)
-
-    print("📥 To ADD:", sorted(to_add))
-    print("📤 To REMOVE:", sorted(to_remove))
-    print("✅ To HOLD:", sorted(to_hold))
-
-        # Print breakdown by ticker
-    print("📋 Summary by Ticker:")
-    for ticker in sorted(filtered_tickers.union(existing_unsold)):
-        short_term = filtered_df.loc[filtered_df["Symbol"].str.upper().str.strip() == ticker, "Short Term"].values
-        medium_term = filtered_df.loc[filtered_df["Symbol"].str.upper().str.strip() == ticker, "Medium Term"].values
-        long_term = filtered_df.loc[filtered_df["Symbol"].str.upper().str.strip() == ticker, "Long Term"].values
-
-        short_term = short_term[0] if len(short_term) > 0 else "N/A"
-        medium_term = medium_term[0] if len(medium_term) > 0 else "N/A"
-        long_term = long_term[0] if len(long_term) > 0 else "N/A"
-
-        if ticker in to_add:
-            reason = "ADD"
-        elif ticker in to_remove:
-            reason = "REMOVE"
-        elif ticker in to_hold:
-            reason = "HOLD"
-        else:
-            reason = "SKIP"
-
-        print(f"{ticker:<8} | Short: {short_term:<5} | Medium: {medium_term:<5} | Long: {long_term:<5} | Action: {reason}")
-
-    return to_add, to_remove
+    rows = pd.DataFrame(
+        [(row[symbol_col - 1], row[selling_price_col - 1]) for row in ws.iter_rows(min_row=6, max_row=ws.max_row, values_only=True)],
+        columns=["Symbol", "Selling Price"],
+    )
+    rows = rows[rows["Symbol"].notna() & (rows["Symbol"].astype(str).str.strip() != "")]
+    unsold = rows["Selling Price"].isna() | (rows["Selling Price"].astype(str).str.strip() == "")
+    return pd.Index(rows.loc[unsold, "Symbol"].astype(str).str.strip().str.upper().unique())
+
+# Compare a sheet's unsold holdings with the screener and classify every symbol:
+# HOLD if held and still screened, REMOVE if held but no longer screened,
+# ADD if screened, not held and not rated Hold short term, SKIP otherwise
+def analyze_sheet(ws, filtered_tickers, filtered_df):
+    headers = extract_headers(ws)
+    held = unsold_symbols(ws, headers)
+    screener = index_screener(filtered_df)
+    screened = pd.Index(sorted(filtered_tickers))
+
+    summary = pd.DataFrame(index=screened.union(held).rename("Symbol"))
+    summary = summary.join(screener[["Short Term", "Medium Term", "Long Term"]])
+    summary["Held"] = summary.index.isin(held)
+    summary["Screened"] = summary.index.isin(screened)
+    short_is_hold = summary["Short Term"].fillna("").astype(str).str.lower() == "hold"
+    summary["Action"] = np.select(
+        [summary["Held"] & summary["Screened"], summary["Held"], ~short_is_hold],
+        ["HOLD", "REMOVE", "ADD"],
+        default="SKIP",
+    )
+    summary[["Short Term", "Medium Term", "Long Term"]] = summary[["Short Term", "Medium Term", "Long Term"]].fillna("N/A")
+
+    to_add = summary.index[summary["Action"] == "ADD"].tolist()
+    to_remove = summary.index[summary["Action"] == "REMOVE"].tolist()
+    to_hold = summary.index[summary["Action"] == "HOLD"].tolist()
+    print("📥 To ADD:", to_add)
+    print("📤 To REMOVE:", to_remove)
+    print("✅ To HOLD:", to_hold)
+    print("📋 Summary:", summary["Action"].value_counts().to_dict())
+
+    return to_add, to_remove, summary.reset_index()
 
 # Run analysis only
 print("📊 TopVolume:")
-added_volume, removed_volume = analyze_sheet(wb["TopVolume"], volume_tickers, filtered_volume_df)
+added_volume, removed_volume, volume_summary = analyze_sheet(wb["TopVolume"], volume_tickers, filtered_volume_df)
 print("📊 Top100:")
-added_top100, removed_top100 = analyze_sheet(wb["Top100"], top100_tickers, filtered_top100_df)
-
-  # Removed saving step
+added_top100, removed_top100, top100_summary = analyze_sheet(wb["Top100"], top100_tickers, filtered_top100_df)
 
-  # Removed workbook saved message
+# Per-ticker breakdown of both sheets in one report
+report_csv = f"{base_folder}/screener_report-{today_str}.csv"
+pd.concat([volume_summary.assign(Sheet="TopVolume"), top100_summary.assign(Sheet="Top100")]).to_csv(report_csv, index=False)
+print(f"📝 Summary by ticker written to {report_csv}")
@@ -0,0 +1,139 @@
+import os
+import glob
+import math
+import logging
+import numpy as np
+import pandas as pd
+from yahoo_cache import MARKET_TZ, market_is_open, last_session_close
+
+logger = logging.getLogger(__name__)
+
+# Bars are kept as one Parquet file per symbol under <BAR_STORE_DIR>/<bar size>/, e.g. bar_store/1day/AAPL.parquet
+BAR_STORE_DIR = os.getenv("IBKR_BAR_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bar_store"))
+
+BAR_FIELDS = ["open", "high", "low", "close", "volume"]
+BAR_SIZE = "1 day"
+
+# History requested for a symbol the store has never seen
+BAR_HISTORY_DURATION = "2 Y"
+
+# Historical-data requests kept open at once (IB allows 50, and paces identical or bursty requests)
+HISTORICAL_MAX_CONCURRENT = 10
+
+# IB duration string covering last_day up to today, refetching last_day since it may have been partial
+def history_duration(last_day, today):
+    days = (today - last_day).days + 1
+    if days > 365:
+        return f"{math.ceil(days / 365)} Y"
+    return f"{max(days, 1)} D"
+
+# Bars as returned by reqHistoricalData (BarData with date/open/high/low/close/volume) as a store frame
+def bars_frame(bars):
+    if not bars:
+        return pd.DataFrame(columns=BAR_FIELDS, index=pd.DatetimeIndex([], name="date"), dtype=float)
+    frame = pd.DataFrame(
+        [[bar.open, bar.high, bar.low, bar.close, bar.volume] for bar in bars],
+        columns=BAR_FIELDS,
+        index=pd.DatetimeIndex([pd.Timestamp(bar.date).tz_localize(None) for bar in bars], name="date"),
+        dtype=float,
+    )
+    return frame
+
+# Per-symbol bar history on disk, read into memory once per file version. Reads slice by date with
+# a binary search on the sorted index, so range reads across many symbols never touch the network.
+class BarStore:
+    def __init__(self, root=BAR_STORE_DIR, bar_size=BAR_SIZE):
+        self.root = root
+        self.bar_size = bar_size
+        self.path = os.path.join(root, bar_size.replace(" ", ""))
+        self._frames = {}  # symbol -> (mtime, frame)
+
+    def _file(self, symbol):
+        return os.path.join(self.path, f"{symbol}.parquet")
+
+    def symbols(self):
+        return sorted(os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(self.path, "*.parquet")))
+
+    # Full history of a symbol (empty frame if none is stored)
+    def read(self, symbol):
+        symbol = symbol.strip().upper()
+        file = self._file(symbol)
+        try:
+            mtime = os.path.getmtime(file)
+        except OSError:
+            return bars_frame([])
+        cached = self._frames.get(symbol)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            frame = pd.read_parquet(file, memory_map=True)
+        except (ImportError, OSError, ValueError) as e:
+            logger.warning(f"Could not read bars for {symbol}: {e}")
+            return bars_frame([])
+        self._frames[symbol] = (mtime, frame)
+        return frame
+
+    def last_day(self, symbol):
+        frame = self.read(symbol)
+        return frame.index[-1].date() if len(frame) else None
+
+    # Merge new bars into a symbol's history; a bar for a date already stored replaces it
+    def append(self, symbol, bars):
+        symbol = symbol.strip().upper()
+        if bars is None or bars.empty:
+            return self.read(symbol)
+        frame = pd.concat([self.read(symbol), bars[BAR_FIELDS].astype(float)])
+        frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+        frame.index.name = "date"
+        os.makedirs(self.path, exist_ok=True)
+        file = self._file(symbol)
+        temp_file = f"{file}.tmp"
+        frame.to_parquet(temp_file)
+        os.replace(temp_file, file)
+        self._frames[symbol] = (os.path.getmtime(file), frame)
+        return frame
+
+    # Load bars from <SYMBOL>.csv files (date,open,high,low,close,volume), e.g. a test fixture
+    def import_csv_dir(self, directory, symbols=None):
+        imported = {}
+        for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+            symbol = os.path.splitext(os.path.basename(path))[0].upper()
+            if symbols and symbol not in symbols:
+                continue
+            frame = pd.read_csv(path, parse_dates=["date"], index_col="date")
+            frame.columns = frame.columns.str.strip().str.lower()
+            imported[symbol] = len(self.append(symbol, frame))
+        logger.info(f"Imported bars for {len(imported)} symbols from {directory}")
+        return imported
+
+    # Bars of one symbol with start <= date <= end (either bound may be None)
+    def bars(self, symbol, start=None, end=None):
+        frame = self.read(symbol)
+        dates = frame.index.values
+        lo = 0 if start is None else dates.searchsorted(np.datetime64(pd.Timestamp(start)), "left")
+        hi = len(dates) if end is None else dates.searchsorted(np.datetime64(pd.Timestamp(end)), "right")
+        return frame.iloc[lo:hi]
+
+    # One field for many symbols over a date range: dates as rows, symbols as columns (NaN where a
+    # symbol has no bar that day)
+    def panel(self, symbols, start=None, end=None, field="close"):
+        columns = {}
+        for symbol in dict.fromkeys(s.strip().upper() for s in symbols):
+            sliced = self.bars(symbol, start, end)
+            if len(sliced):
+                columns[symbol] = sliced[field]
+        if not columns:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name="date"), dtype=float)
+        return pd.DataFrame(columns)
+
+    # True if the store already holds the last completed session's bar for a symbol
+    def is_current(self, symbol, now=None):
+        now = now or pd.Timestamp.now(tz=MARKET_TZ)
+        last_day = self.last_day(symbol)
+        return last_day is not None and not market_is_open(now) and last_day >= last_session_close(now).date()
+
+    # IB duration string needed to bring a symbol up to date
+    def missing_duration(self, symbol, now=None):
+        now = now or pd.Timestamp.now(tz=MARKET_TZ)
+        last_day = self.last_day(symbol)
+        return BAR_HISTORY_DURATION if last_day is None else history_duration(last_day, now.date())
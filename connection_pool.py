@@ -0,0 +1,67 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+from engine import RateLimiter, run_prioritized
+from order_index import OrderIndex, normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+# Virtual nodes per connection on the hash ring; more points spread tickers more evenly
+HASH_RING_REPLICAS = 64
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], "big")
+
+# Consistent hash ring: a key always maps to the same node while the node set is unchanged, and
+# adding or removing a node only moves the keys that node owned
+class ConsistentHashRing:
+    def __init__(self, nodes, replicas=HASH_RING_REPLICAS):
+        self._points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in self._points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._points)
+        return self._points[index][1]
+
+# One API connection with its own message pacing and view of the orders it placed. IB paces messages
+# and scopes order cancellation per client ID, so each connection needs both.
+class PoolConnection:
+    def __init__(self, ib, pacer=None, order_index=None):
+        self.ib = ib
+        self.pacer = pacer or RateLimiter()
+        self.order_index = order_index or OrderIndex(ib)
+
+    @property
+    def client_id(self):
+        return self.ib.client.clientId
+
+# Connections to the same gateway with distinct client IDs; tickers are sharded across them by
+# consistent hashing, so a ticker's orders always go through (and can be cancelled by) the same client
+class ExecutionPool:
+    def __init__(self, connections):
+        self.connections = {connection.client_id: connection for connection in connections}
+        self._ring = ConsistentHashRing(self.connections)
+
+    def __len__(self):
+        return len(self.connections)
+
+    def connection_for(self, symbol):
+        return self.connections[self._ring.node_for(normalize_symbol(symbol))]
+
+    # Run (ticker, priority, job) triples grouped by shard, each shard with its own concurrency budget and
+    # priority scheduling. Jobs for one ticker keep their order; shards run side by side on the shared
+    # event loop.
+    async def run_sharded(self, jobs):
+        shards = {}
+        for key, priority, job in jobs:
+            shards.setdefault(self.connection_for(key).client_id, []).append((key, priority, job))
+
+        await asyncio.gather(*(run_prioritized(shard_jobs) for shard_jobs in shards.values()))
+        if len(shards) > 1:
+            logger.info(f"Spread {len(jobs)} jobs over {len(shards)} connections: "
+                        + ", ".join(f"client {client_id}: {len(shard)}" for client_id, shard in sorted(shards.items())))
+
+    def disconnect(self):
+        for connection in self.connections.values():
+            connection.ib.disconnect()
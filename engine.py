@@ -0,0 +1,99 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+# IB accepts about 50 API messages per second per client; stay a little under it
+IB_MESSAGES_PER_SECOND = 45
+
+# Number of tickers worked on at the same time
+MAX_CONCURRENT_TICKERS = 20
+
+# Priority classes of scheduled work, lowest first: cancels and closes take risk off, trailing
+# limits protect open positions, new entries can wait
+PRIORITY_CANCEL = 0
+PRIORITY_PROTECT = 1
+PRIORITY_ENTRY = 2
+
+# Priority of the job running in the current task; messages it sends are paced in this class
+current_priority = contextvars.ContextVar("current_priority", default=PRIORITY_ENTRY)
+
+# Token bucket that keeps outgoing API messages under IB's message-rate limit. When messages have to
+# wait, tokens go to the waiting message with the best priority (then the earliest), so a cancel
+# queued behind a burst of entries goes out next instead of last.
+class RateLimiter:
+    def __init__(self, rate=IB_MESSAGES_PER_SECOND, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._waiters = []  # heap of (priority, sequence, messages, future)
+        self._sequence = itertools.count()
+        self._dispatcher = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Hand out tokens to the waiters in priority order until none are left waiting
+    async def _dispatch(self):
+        while self._waiters:
+            priority, _, messages, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            self._refill()
+            if self.tokens >= messages:
+                heapq.heappop(self._waiters)
+                self.tokens -= messages
+                future.set_result(None)
+            else:
+                await asyncio.sleep((messages - self.tokens) / self.rate)
+        self._dispatcher = None
+
+    # Wait until the given number of messages may be sent, by default in the current job's priority class
+    async def acquire(self, messages=1, priority=None):
+        self._refill()
+        if not self._waiters and self.tokens >= messages:
+            self.tokens -= messages
+            return
+        future = asyncio.get_event_loop().create_future()
+        priority = current_priority.get() if priority is None else priority
+        heapq.heappush(self._waiters, (priority, next(self._sequence), messages, future))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+
+# Run (key, priority, job) triples concurrently across keys while jobs sharing a key run one after
+# another in the order given, e.g. a CLOSE followed by a new BUY for the same ticker. Keys take
+# concurrency slots in order of the best priority among their jobs, so a ticker with a CLOSE starts
+# ahead of tickers with only new entries, and each job's messages are paced in its own class.
+async def run_prioritized(jobs, max_concurrency=MAX_CONCURRENT_TICKERS):
+    chains = {}
+    for key, priority, job in jobs:
+        chains.setdefault(key, []).append((priority, job))
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_chain(key, chain):
+        async with semaphore:
+            for priority, job in chain:
+                current_priority.set(priority)
+                try:
+                    await job()
+                except Exception as e:
+                    logger.error(f"Job for {key} failed: {e}")
+
+    started = time.monotonic()
+    ordered = sorted(chains.items(), key=lambda item: min(priority for priority, _ in item[1]))
+    await asyncio.gather(*(run_chain(key, chain) for key, chain in ordered))
+    logger.info(f"Ran {len(jobs)} jobs across {len(chains)} tickers in {time.monotonic() - started:.2f}s")
+
+# Run (key, job) pairs as new entries, ordered per key as in run_prioritized
+async def run_ordered_by_key(jobs, max_concurrency=MAX_CONCURRENT_TICKERS):
+    await run_prioritized([(key, PRIORITY_ENTRY, job) for key, job in jobs], max_concurrency)
@@ -0,0 +1,104 @@
+import hashlib
+import sqlite3
+import logging
+from datetime import datetime
+from journal import JOURNAL_FILE
+
+logger = logging.getLogger(__name__)
+
+# Intent states: written before submission, then resolved from what the broker acknowledged. A sent
+# intent is closed once its outcome is saved (workbook or checkpoint); sending the same unit of work
+# again after that is a new attempt.
+INTENT_PENDING = "pending"
+INTENT_SENT = "sent"
+INTENT_FAILED = "failed"
+INTENT_CLOSED = "closed"
+
+# Deterministic key of one unit of work (e.g. a sheet row with its values) on the given trading day
+def intent_key(*parts, day=None):
+    day = day or datetime.now().strftime("%Y%m%d")
+    digest = hashlib.sha1("|".join(str(part).strip().upper() for part in parts).encode()).hexdigest()
+    return f"it-{day}-{digest[:12]}"
+
+# orderRef of one attempt at a unit of work; each attempt has its own ref, so a late ack for one
+# attempt can be told apart from the next at the broker
+def intent_ref(key, attempt):
+    return f"{key}.{attempt}"
+
+def parse_intent_ref(order_ref):
+    key, _, attempt = order_ref.rpartition(".")
+    return key, int(attempt)
+
+# Write-ahead log of order intents, kept in the trade journal database (SQLite, WAL). An intent is
+# recorded as pending before its orders are submitted and marked sent or failed afterwards; pending
+# and failed intents are resolved against the broker's orders and executions when their work comes up again.
+class IntentLog:
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS intents ("
+            "order_ref TEXT PRIMARY KEY, source TEXT, symbol TEXT NOT NULL, action TEXT, order_type TEXT, "
+            "quantity REAL, state TEXT NOT NULL, created TEXT NOT NULL, updated TEXT NOT NULL, "
+            "intent_key TEXT, attempt INTEGER)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS intents_state ON intents (state)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS intents_key ON intents (intent_key, attempt)")
+        self.conn.commit()
+
+    # Record an intent as pending; this is committed before any order carrying its ref is sent
+    def begin(self, order_ref, source, symbol, action, order_type, quantity=None):
+        key, attempt = parse_intent_ref(order_ref)
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO intents (order_ref, source, symbol, action, order_type, quantity, state, created, updated, "
+                "intent_key, attempt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (order_ref) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                (order_ref, source, symbol, action, order_type, quantity, INTENT_PENDING, now, now, key, attempt),
+            )
+
+    def finish(self, order_ref, state):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE intents SET state = ?, updated = ? WHERE order_ref = ?",
+                (state, datetime.now().isoformat(timespec="seconds"), order_ref),
+            )
+
+    # Close the given intents that were sent, once their outcome has been saved
+    def close_sent(self, order_refs):
+        order_refs = list(order_refs)
+        with self.conn:
+            for start in range(0, len(order_refs), 500):
+                chunk = order_refs[start:start + 500]
+                self.conn.execute(
+                    f"UPDATE intents SET state = ?, updated = ? WHERE state = ? AND order_ref IN ({','.join('?' * len(chunk))})",
+                    [INTENT_CLOSED, datetime.now().isoformat(timespec="seconds"), INTENT_SENT] + chunk,
+                )
+
+    # States of the given refs ({order_ref: state}); unknown refs are left out
+    def states(self, order_refs):
+        order_refs = list(order_refs)
+        found = {}
+        for start in range(0, len(order_refs), 500):
+            chunk = order_refs[start:start + 500]
+            query = f"SELECT order_ref, state FROM intents WHERE order_ref IN ({','.join('?' * len(chunk))})"
+            found.update(self.conn.execute(query, chunk).fetchall())
+        return found
+
+    # Latest attempt per intent key ({key: (order_ref, state, attempt)}); unknown keys are left out
+    def latest(self, keys):
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            query = (f"SELECT intent_key, order_ref, state, attempt FROM intents "
+                     f"WHERE intent_key IN ({','.join('?' * len(chunk))}) ORDER BY attempt")
+            for key, order_ref, state, attempt in self.conn.execute(query, chunk):
+                found[key] = (order_ref, state, attempt)
+        return found
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Local append-only record of every fill, kept next to the scripts
+JOURNAL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trade_journal.db")
+
+# Columns of the Log sheet, in order
+LOG_COLUMNS = ["Date", "Symbol", "Type", "Quantity", "Price"]
+
+# Append-only trade journal in SQLite (WAL mode): recording a fill is a single insert no matter
+# how long the history is, and the Log sheet is materialized from it only when asked for
+class TradeJournal:
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS fills ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, symbol TEXT NOT NULL, "
+            "type TEXT NOT NULL, quantity REAL, price REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS fills_date ON fills (date)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    # Record one Log entry (a dict with the Log sheet columns)
+    def record(self, log_entry):
+        self.conn.execute(
+            "INSERT INTO fills (date, symbol, type, quantity, price) VALUES (?, ?, ?, ?, ?)",
+            [log_entry[col] for col in LOG_COLUMNS],
+        )
+        self.conn.commit()
+
+    # Import rows of an existing Log sheet once, so the journal holds the full history
+    def import_log_sheet(self, df):
+        if self.conn.execute("SELECT value FROM meta WHERE key = 'log_sheet_imported'").fetchone():
+            return 0
+        rows = [
+            [None if pd.isna(value) else (str(value) if col == "Date" else value) for col, value in zip(LOG_COLUMNS, row)]
+            for row in df.reindex(columns=LOG_COLUMNS).itertuples(index=False)
+        ]
+        rows = [row for row in rows if row[0] and row[1]]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO fills (date, symbol, type, quantity, price) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('log_sheet_imported', '1')")
+        logger.info(f"Imported {len(rows)} rows from the Log sheet into the trade journal")
+        return len(rows)
+
+    # Journal rows as a Log-sheet DataFrame, optionally limited to a date range (inclusive, YYYY-MM-DD)
+    def to_frame(self, start=None, end=None):
+        query = "SELECT date, symbol, type, quantity, price FROM fills"
+        conditions, params = [], []
+        if start:
+            conditions.append("date >= ?")
+            params.append(str(start))
+        if end:
+            conditions.append("date < ?")
+            params.append(f"{end}~")  # sorts after any time on the end date
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date, id"
+        return pd.DataFrame(self.conn.execute(query, params).fetchall(), columns=LOG_COLUMNS)
+
+    def close(self):
+        self.conn.close()
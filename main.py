@@ -3,19 +3,32 @@ import pandas as pd
 import math
 import ast
 import os
+import asyncio
+import time
+from functools import partial
 from utils import (
-    ib, get_market_price, qualify_contract, place_market_order,
-    attach_trailing_limit, cancel_existing_orders, get_remaining_quantity,
-    update_sheet_in_excel, append_to_log, place_limit_order,
+    ib, get_market_price, get_market_prices, qualify_contract, place_market_order,
+    get_remaining_quantity, update_sheet_in_excel, append_to_log,
     cancel_all_open_orders, add_trailing_limit_to_holdings,
-    update_orders_page, init_ibkr_connection
+    update_orders_page, init_ibkr_connection, warm_contract_cache,
+    order_accepted, get_reject_reason, place_bracket_order,
+    place_market_order_async, place_bracket_order_async, attach_trailing_limit_async,
+    cancel_existing_orders_async, wait_for_position_async,
+    open_workbook_session, commit_workbook_session, export_log_sheet, prefetch_quotes,
+    resolve_intents, close_intents, close_intents_on_save, run_intent_async, run_jobs, disconnect_ibkr, fill_bar_store
 )
-
-# Configuration Flags
-Trading_Mode = "Live"
+from row_plan import plan_sheet, ORDER_TYPE_PRIORITY
+from engine import PRIORITY_ENTRY
+from intent_log import intent_key
+from trade_ingest import TradeFileError, TradeFileCheckpoint, validate_trade_file, iter_pending_chunks
+from metrics import instrument, export_run_metrics, reset_run
+
+# Configuration Flags ("Live", "Paper", or "Sim" for the offline simulated gateway)
+Trading_Mode = os.getenv("IBKR_TRADING_MODE", "Live")
 CANCEL_ALL_FIRST = False
 APPLY_TRAIL_TO_HOLDINGS = False
 RUN_ORDER_PAGE_UPDATE = False
+BULK_TRADE_FILE = "Trade_File.csv"
 
 # Logging setup
 logging.getLogger('ib_insync').setLevel(logging.WARNING)
@@ -28,36 +41,37 @@ init_ibkr_connection(Trading_Mode)
 # Excel file path is determined by init_ibkr_connection
 from utils import excel_file
 
-def handle_market_orders(index, df, ticker, amount, quantity, action, order_type, trail_limit_percent):
+@instrument("handler.market", ticker="ticker")
+async def handle_market_orders(index, df, ticker, amount, quantity, action, order_type, trail_limit_percent, contract, market_price):
     try:
-        market_price = get_market_price(ticker)
+        if not market_price:
+            raise ValueError("no market price")
         quantity = math.ceil(amount / market_price) if quantity is None else quantity
-        contract = qualify_contract(ticker)
-        trade = place_market_order(contract, action, quantity)
-        if trade.orderStatus.status in ["Filled", "Submitted"]:
+        if order_type == "MKT-ATCH-LIMIT":
+            trade, trailing_trade = await place_bracket_order_async(contract, action, quantity, market_price, trail_limit_percent)
+            status = "Order Placed with Limit Attached" if order_accepted(trailing_trade) else None
+        else:
+            trade = await place_market_order_async(contract, action, quantity)
+            status = "MKT Order Placed"
+        if order_accepted(trade):
             df.at[index, "Quantity"] = quantity
             df.at[index, "Amount"] = math.ceil(quantity * market_price)
-            if order_type == "MKT-ATCH-LIMIT":
-                trailing_trade = attach_trailing_limit(contract, action, quantity, market_price, trail_limit_percent)
-                if trailing_trade.orderStatus.status in ["Filled", "Submitted"]:
-                    df.at[index, "Status"] = "Order Placed with Limit Attached"
-            else:
-                df.at[index, "Status"] = "MKT Order Placed"
+            if status:
+                df.at[index, "Status"] = status
             df.at[index, "Execution"] = " "
             append_to_log(ticker, action, quantity, market_price)
             logger.info(f"[{order_type}] {action} {quantity} shares of {ticker} at ${market_price:.2f}")
     except Exception as e:
         logger.error(f"Error processing market order for {ticker}: {e}")
 
-def handle_remove_limit_order(index, df, ticker, cancelled_tickers):
+@instrument("handler.remove_limit", ticker="ticker")
+async def handle_remove_limit_order(index, df, ticker, cancelled_tickers):
     try:
         logger.info(f"[REMOVE-LIMIT] Checking open orders for {ticker}:")
         if ticker not in cancelled_tickers:
-            initial_count = len(ib.trades())
-            cancel_existing_orders(ticker)
-            final_count = len([t for t in ib.trades() if t.orderStatus.status != "Cancelled"])
+            cancelled = await cancel_existing_orders_async(ticker)
             cancelled_tickers.add(ticker)
-            if initial_count > final_count:
+            if any(t.orderStatus.status in ["Cancelled", "ApiCancelled"] for t in cancelled):
                 df.at[index, "Status"] = "Limit Order Cancelled"
                 df.at[index, "Execution"] = " "
                 logger.info(f"[REMOVE-LIMIT] {ticker}: Limit order(s) cancelled.")
@@ -66,119 +80,213 @@ def handle_remove_limit_order(index, df, ticker, cancelled_tickers):
     except Exception as e:
         logger.error(f"Error cancelling orders for {ticker}: {e}")
 
-def handle_attach_limit(index, df, ticker, quantity, action, trail_limit_percent):
+@instrument("handler.attach_limit", ticker="ticker")
+async def handle_attach_limit(index, df, ticker, quantity, action, trail_limit_percent, contract, market_price):
     try:
-        contract = qualify_contract(ticker)
-        cancel_existing_orders(ticker)
-        market_price = get_market_price(ticker)
+        if not market_price:
+            raise ValueError("no market price")
+        await cancel_existing_orders_async(ticker)
         if not quantity:
             quantity = get_remaining_quantity(ticker)
-        trailing_trade = attach_trailing_limit(contract, action, quantity, market_price, trail_limit_percent)
-        if trailing_trade.orderStatus.status in ["Filled", "Submitted"]:
+        trailing_trade = await attach_trailing_limit_async(contract, action, quantity, market_price, trail_limit_percent)
+        if order_accepted(trailing_trade):
             df.at[index, "Status"] = "Order Placed with Limit Attached"
             df.at[index, "Execution"] = " "
             logger.info(f"[ATCH-LMT] {ticker}: Trailing limit set for {quantity} shares at ${market_price:.2f}")
     except Exception as e:
         logger.error(f"Error attaching trailing limit for {ticker}: {e}")
 
-def handle_lmt_attach_trail_limit(index, df, ticker, amount, quantity, action, trail_limit_percent):
+@instrument("handler.lmt_attach_trail", ticker="ticker")
+async def handle_lmt_attach_trail_limit(index, df, ticker, amount, quantity, action, trail_limit_percent, contract, market_price):
     try:
-        contract = qualify_contract(ticker)
-        market_price = get_market_price(ticker)
+        if not market_price:
+            raise ValueError("no market price")
         limit_price = round(market_price + 0.10, 2)
 
         logger.info(f"{ticker} Market Price = {market_price}, Limit Price = {limit_price}")
 
         quantity = math.ceil(amount / limit_price) if quantity is None else quantity
 
-        trade = place_limit_order(contract, action, quantity, market_price)
-        if trade.orderStatus.status in ["Filled", "Submitted"]:
+        trade, trailing_trade = await place_bracket_order_async(
+            contract, action, quantity, market_price, trail_limit_percent, entry_type="LMT", trail_price=limit_price
+        )
+        if order_accepted(trade):
             df.at[index, "Quantity"] = quantity
             df.at[index, "Amount"] = math.ceil(quantity * limit_price)
-            trailing_trade = attach_trailing_limit(contract, action, quantity, limit_price, trail_limit_percent)
-            if trailing_trade.orderStatus.status in ["Filled", "Submitted"]:
+            if order_accepted(trailing_trade):
                 df.at[index, "Status"] = "LMT with Trailing Limit Attached"
                 df.at[index, "Execution"] = " "
                 append_to_log(ticker, action, quantity, limit_price)
                 logger.info(f"[LMT-ATTCH-TRAIL-LIMIT] {action} {quantity} shares of {ticker} at ${limit_price:.2f} with trailing limit")
         else:
-            logger.warning(f"[LMT-ATTCH-TRAIL-LIMIT] {ticker}: Limit order not submitted (status: {trade.orderStatus.status})")
+            logger.warning(f"[LMT-ATTCH-TRAIL-LIMIT] {ticker}: Limit order not submitted (status: {trade.orderStatus.status}, reason: {get_reject_reason(trade)})")
     except Exception as e:
         logger.error(f"Error in LMT-ATTCH-TRAIL-LIMIT for {ticker}: {e}")
 
-def handle_close(index, df, ticker, quantity, action):
+@instrument("handler.close", ticker="ticker")
+async def handle_close(index, df, ticker, quantity, action, contract, market_price):
     try:
-        contract = qualify_contract(ticker)
-        cancel_existing_orders(ticker)
+        await cancel_existing_orders_async(ticker)
+        position = get_remaining_quantity(ticker)
         if pd.isna(quantity) or quantity in ["", " "]:
-            quantity = get_remaining_quantity(ticker)
+            quantity = position
         close_action = "SELL" if action == "BUY" else "BUY"
-        trade = place_market_order(contract, close_action, quantity)
-        if trade.orderStatus.status in ["Filled", "Submitted"]:
-            remaining = get_remaining_quantity(ticker)
+        trade = await place_market_order_async(contract, close_action, quantity)
+        if order_accepted(trade):
+            expected = position - quantity if close_action == "SELL" else position + quantity
+            remaining = await wait_for_position_async(ticker, expected)
             df.at[index, "Quantity"] = pd.NA if remaining == 0 else remaining
             df.at[index, "Status"] = "Closed"
             df.at[index, "Execution"] = " "
-            final_price = get_market_price(ticker)
+            final_price = market_price or 0
             append_to_log(ticker, close_action, quantity, final_price)
             logger.info(f"[CLOSE] {ticker}: Closed {quantity} shares at ${final_price:.2f}")
     except Exception as e:
         logger.error(f"Error closing position for {ticker}: {e}")
 
+# Validate every sheet and qualify and price all planned tickers in one batch before any rows are handled.
+# Rejected rows get their reason in the Status column.
+def plan_sheets(sheets, rows=None):
+    plans = []
+    for sheet_name, df in sheets.items():
+        if rows is not None and sheet_name not in rows:
+            continue
+        planned, rejected = plan_sheet(sheet_name, df, None if rows is None else rows[sheet_name])
+        if len(rejected):
+            if "Status" in df.columns:
+                df["Status"] = df["Status"].astype(object)
+            df.loc[rejected.index, "Status"] = "Rejected: " + rejected
+        plans += planned
+    contracts = warm_contract_cache([plan.symbol for plan in plans])
+    prices = get_market_prices([plan.symbol for plan in plans if plan.order_type != "REMOVE-LIMIT-ORDER"])
+    return plans, contracts, prices
+
+# Turn one planned row into a handler job, or None if its contract could not be qualified
+def plan_job(plan, df, contracts, prices, cancelled_tickers):
+    contract = contracts.get(plan.symbol)
+    market_price = prices.get(plan.symbol)
+    index, ticker, action, quantity = plan.index, plan.symbol, plan.action, plan.quantity
+    if contract is None and plan.order_type != "REMOVE-LIMIT-ORDER":
+        logger.error(f"{ticker}: contract could not be qualified, skipping row {index} of sheet {plan.sheet}")
+        return None
+    match plan.order_type:
+        case "LMT-ATTCH-TRAIL-LIMIT":
+            return partial(handle_lmt_attach_trail_limit, index, df, ticker, plan.amount, quantity, action, plan.trail_percent, contract, market_price)
+        case "MKT" | "MKT-ATCH-LIMIT":
+            return partial(handle_market_orders, index, df, ticker, plan.amount, quantity, action, plan.order_type, plan.trail_percent, contract, market_price)
+        case "REMOVE-LIMIT-ORDER":
+            return partial(handle_remove_limit_order, index, df, ticker, cancelled_tickers)
+        case "ATCH-LMT":
+            return partial(handle_attach_limit, index, df, ticker, quantity, action, plan.trail_percent, contract, market_price)
+        case "CLOSE":
+            return partial(handle_close, index, df, ticker, quantity, action, contract, market_price)
+    return None
+
+# Intent key of a sheet row: the same row with the same values on the same day maps to the same key
+def row_intent_key(plan):
+    return intent_key(plan.sheet, plan.index, plan.symbol, plan.order_type, plan.action, plan.quantity, plan.amount)
+
+# A REMOVE-LIMIT-ORDER row merged into the one before it for the same ticker gets the same outcome
+async def run_merged_cancel(job, rows):
+    await job()
+    (df, index), *merged = rows
+    for merged_df, merged_index in merged:
+        merged_df.at[merged_index, "Status"] = df.at[index, "Status"]
+        merged_df.at[merged_index, "Execution"] = df.at[index, "Execution"]
+
+# Handle the TRANSMIT rows of all sheets concurrently. Rows for different tickers run in parallel
+# within IB's pacing limits, scheduled by priority: cancels and closes first, then trailing limits
+# for held positions, then new entries. Rows for the same ticker keep their sheet order, and
+# REMOVE-LIMIT-ORDER rows directly following one another for a ticker are sent as one cancel.
+# Each row's orders carry an orderRef recorded in the intent log first, so rows already sent by a run
+# that stopped before saving the workbook are recognized and not sent again; once the workbook is
+# saved, the row's intent is closed and a later TRANSMIT of the same row is sent as a new attempt.
+# When rows is given ({sheet name: row indexes}), only those rows are handled.
+def process_sheets(sheets, rows=None):
+    plans, contracts, prices = plan_sheets(sheets, rows)
+    keys = {id(plan): row_intent_key(plan) for plan in plans if plan.order_type != "REMOVE-LIMIT-ORDER"}
+    refs, recovered = resolve_intents(list(keys.values()))
+    cancelled_tickers = {sheet_name: set() for sheet_name in sheets}
+    jobs = []
+    last_cancel = {}  # ticker -> rows of its latest job while that job is a REMOVE-LIMIT-ORDER
+    for plan in plans:
+        df = sheets[plan.sheet]
+        key = keys.get(id(plan))
+        ref = refs.get(key)
+        if key in recovered:
+            df.at[plan.index, "Status"] = "Sent (recovered)"
+            df.at[plan.index, "Execution"] = " "
+            logger.info(f"{plan.symbol}: row {plan.index} of sheet {plan.sheet} was already sent as {ref}, skipping")
+            continue
+        if plan.order_type == "REMOVE-LIMIT-ORDER" and plan.symbol in last_cancel:
+            last_cancel[plan.symbol].append((df, plan.index))
+            logger.info(f"{plan.symbol}: REMOVE-LIMIT-ORDER in row {plan.index} of sheet {plan.sheet} merged with the cancel before it")
+            continue
+        job = plan_job(plan, df, contracts, prices, cancelled_tickers[plan.sheet])
+        if job and ref:
+            job = partial(run_intent_async, ref, job, plan.sheet, plan.symbol, plan.action, plan.order_type, plan.quantity)
+        if not job:
+            continue
+        if plan.order_type == "REMOVE-LIMIT-ORDER":
+            merged_rows = [(df, plan.index)]
+            job = partial(run_merged_cancel, job, merged_rows)
+            last_cancel[plan.symbol] = merged_rows
+        else:
+            last_cancel.pop(plan.symbol, None)
+        jobs.append((plan.symbol, ORDER_TYPE_PRIORITY[plan.order_type], job))
+    run_jobs(jobs)
+    for sheet_name, df in sheets.items():
+        update_sheet_in_excel(sheet_name, df)
+    close_intents_on_save(refs.values())
+
 def process_sheet(sheet_name, df):
-    cancelled_tickers = set()
-    for index, row in df.iterrows():
-        try:
-            execution = str(row.get("Execution", "")).strip().upper()
-            if execution != "TRANSMIT":
-                continue
-            ticker = row["Ticker"]
-            amount = row["Amount"]
-            order_type = str(row.get("OrderType", "")).strip().upper()
-            trail_limit_percent = row.get("TrailLimit%", 4.0)
-            quantity = row.get("Quantity", None)
-            quantity = int(quantity) if not pd.isna(quantity) else None
-            action = "BUY" if sheet_name.startswith("BUY") else "SELL"
-            match order_type:
-                case "LMT-ATTCH-TRAIL-LIMIT":
-                    handle_lmt_attach_trail_limit(index, df, ticker, amount, quantity, action, trail_limit_percent)
-                case "MKT" | "MKT-ATCH-LIMIT":
-                    handle_market_orders(index, df, ticker, amount, quantity, action, order_type, trail_limit_percent)
-                case "REMOVE-LIMIT-ORDER":
-                    if quantity in [None, "", " "]:
-                        handle_remove_limit_order(index, df, ticker, cancelled_tickers)
-                case "ATCH-LMT":
-                    handle_attach_limit(index, df, ticker, quantity, action, trail_limit_percent)
-                case "CLOSE":
-                    handle_close(index, df, ticker, quantity, action)
-        except Exception as e:
-            logger.error(f"Unexpected error in row {index} of sheet {sheet_name}: {e}")
-    update_sheet_in_excel(sheet_name, df)
-
-def process_inline_trades(trade_file_path="Trade_File.txt"):
+    process_sheets({sheet_name: df})
+
+# Parse the trade file into {"BUY": [...], "SELL": [...]}, or None if it is missing or invalid
+def read_inline_trades(trade_file_path="Trade_File.txt"):
     if not os.path.exists(trade_file_path):
         logger.warning(f"⚠️ Trade file {trade_file_path} does not exist.")
-        return
+        return None
 
     with open(trade_file_path, "r") as file:
         content = file.read()
     
     try:
-        trade_config = ast.literal_eval(content)
+        return ast.literal_eval(content)
     except Exception as e:
         logger.error(f"Error parsing trade file: {e}")
+        return None
+
+# Identity of one trade file entry, used to skip entries that were already handled
+def inline_trade_key(mode, item):
+    return (mode, tuple(str(value).strip().upper() for value in item))
+
+# Process the trade file; when a seen set is given, entries already in it are skipped and new ones are added
+def process_inline_trades(trade_file_path="Trade_File.txt", seen=None):
+    trade_config = read_inline_trades(trade_file_path)
+    if trade_config is None:
         return
 
+    pending = {
+        mode: [
+            item for item in trade_config.get(mode, [])
+            if len(item) >= 4 and (seen is None or inline_trade_key(mode, item) not in seen)
+        ]
+        for mode in ["BUY", "SELL"]
+    }
+    if seen is not None:
+        seen.update(inline_trade_key(mode, item) for mode, items in pending.items() for item in items)
+
+    prices = get_market_prices([item[0] for items in pending.values() for item in items])
+
     for mode in ["BUY", "SELL"]:
-        trades = trade_config.get(mode, [])
+        trades = pending[mode]
         if not trades:
             continue
 
         action = mode  # "BUY" or "SELL"
 
         for item in trades:
-            if len(item) < 4:
-                continue
             try:
                 symbol = item[0].upper()
                 amount = int(item[1])
@@ -186,30 +294,27 @@ def process_inline_trades(trade_file_path="Trade_File.txt"):
                 order_type = item[3].upper()
 
                 contract = qualify_contract(symbol)
-                market_price = get_market_price(symbol)
+                market_price = prices.get(symbol) or get_market_price(symbol)
 
                 quantity = math.ceil(amount / market_price)
 
                 logger.info(f"Processing {action} {symbol} - Amount ${amount}, Qty {quantity}, OrderType {order_type}")
 
                 if order_type == "MKT-ATCH-LIMIT":
-                    # Place MKT order first
-                    trade = place_market_order(contract, action, quantity)
-                    ib.sleep(1)
-                    if trade.orderStatus.status in ["Submitted", "Filled"]:
-                        # Then attach a trailing limit
-                        attach_trailing_limit(contract, action, quantity, market_price, trail_limit)
+                    # Place MKT order with its trailing limit as one bracket
+                    trade, trailing_trade = place_bracket_order(contract, action, quantity, market_price, trail_limit)
+                    if order_accepted(trade) and order_accepted(trailing_trade):
                         logger.info(f"{symbol}: Market order placed and trailing limit attached ({trail_limit}%)")
                 elif order_type == "MKT":
                     # Simple market order
                     trade = place_market_order(contract, action, quantity)
                     logger.info(f"{symbol}: Market order placed.")
                 elif order_type == "LMT-ATTCH-TRAIL-LIMIT":
-                    # Place LMT and attach trailing
-                    trade = place_limit_order(contract, action, quantity, market_price)
-                    ib.sleep(1)
-                    if trade.orderStatus.status in ["Submitted", "Filled"]:
-                        attach_trailing_limit(contract, action, quantity, market_price, trail_limit)
+                    # Place LMT with its trailing limit as one bracket
+                    trade, trailing_trade = place_bracket_order(
+                        contract, action, quantity, market_price, trail_limit, entry_type="LMT"
+                    )
+                    if order_accepted(trade) and order_accepted(trailing_trade):
                         logger.info(f"{symbol}: Limit order placed and trailing limit attached ({trail_limit}%)")
                 else:
                     logger.warning(f"Unknown OrderType '{order_type}' for {symbol}. Skipping.")
@@ -224,6 +329,83 @@ def process_inline_trades(trade_file_path="Trade_File.txt"):
     # ✅ Finally update the orders page view
     update_orders_page(Trading_Mode)
 
+# Place one bulk trade record and mark it done in the checkpoint
+async def place_bulk_trade(record, contract, market_price, checkpoint):
+    placed = False
+    try:
+        if contract is None:
+            raise ValueError("contract could not be qualified")
+        if not market_price:
+            raise ValueError("no market price")
+        quantity = record.quantity or math.ceil(record.amount / market_price)
+        if record.order_type == "MKT-ATCH-LIMIT":
+            trade, trailing_trade = await place_bracket_order_async(contract, record.action, quantity, market_price, record.trail_percent)
+        elif record.order_type == "LMT-ATTCH-TRAIL-LIMIT":
+            trade, trailing_trade = await place_bracket_order_async(
+                contract, record.action, quantity, market_price, record.trail_percent, entry_type="LMT"
+            )
+        else:
+            trade = await place_market_order_async(contract, record.action, quantity)
+        placed = order_accepted(trade)
+        if placed:
+            append_to_log(record.symbol, record.action, quantity, market_price)
+            logger.info(f"[BULK] line {record.line}: {record.order_type} {record.action} {quantity} {record.symbol} at ${market_price:.2f}")
+        else:
+            logger.warning(f"[BULK] line {record.line}: {record.symbol} not accepted ({get_reject_reason(trade)})")
+    except Exception as e:
+        logger.error(f"[BULK] line {record.line}: error placing {record.symbol}: {e}")
+    checkpoint.record_done(record.line, placed)
+
+# Trade a large .csv or .jsonl trade list. The file is validated up front and then streamed in chunks;
+# while one chunk is being placed the next chunk is already qualified and subscribed to quotes.
+# Progress is checkpointed next to the file, so an interrupted run resumes where it stopped.
+def process_bulk_trades(trade_file_path=BULK_TRADE_FILE):
+    if not os.path.exists(trade_file_path):
+        logger.warning(f"⚠️ Bulk trade file {trade_file_path} does not exist.")
+        return
+    try:
+        valid, errors = validate_trade_file(trade_file_path)
+    except TradeFileError as e:
+        logger.error(f"❌ {e}")
+        return
+    logger.info(f"{trade_file_path}: {valid} valid records, {len(errors)} invalid records skipped")
+
+    checkpoint = TradeFileCheckpoint(trade_file_path)
+    chunks = iter_pending_chunks(trade_file_path, checkpoint)
+    current = next(chunks, None)
+    if current:
+        prefetch_quotes([record.symbol for record in current[0]])
+    while current:
+        records, last_line, digest = current
+        upcoming = next(chunks, None)
+        if upcoming and upcoming[0]:
+            prefetch_quotes([record.symbol for record in upcoming[0]])
+        if records:
+            symbols = [record.symbol for record in records]
+            contracts = warm_contract_cache(symbols)
+            prices = get_market_prices(symbols)
+            keys = {record.line: intent_key(trade_file_path, record.line, record.symbol, record.order_type, record.action) for record in records}
+            refs, recovered = resolve_intents(list(keys.values()))
+            jobs = []
+            for record in records:
+                if keys[record.line] in recovered:
+                    logger.info(f"[BULK] line {record.line}: {record.symbol} was already sent, skipping")
+                    checkpoint.record_done(record.line, True)
+                    continue
+                job = partial(place_bulk_trade, record, contracts.get(record.symbol), prices.get(record.symbol), checkpoint)
+                jobs.append((record.symbol, PRIORITY_ENTRY, partial(
+                    run_intent_async, refs[keys[record.line]], job, "bulk", record.symbol, record.action, record.order_type, record.quantity
+                )))
+            run_jobs(jobs)
+        checkpoint.chunk_done(last_line, digest)
+        if records:
+            close_intents(refs.values())
+        logger.info(f"{trade_file_path}: done through line {last_line} ({checkpoint.placed} placed, {checkpoint.failed} failed)")
+        current = upcoming
+
+    logger.info(f"✅ Bulk trade file processed: {checkpoint.placed} placed, {checkpoint.failed} failed.")
+    update_orders_page(Trading_Mode)
+
 # Set this flag to True if you want to cancel all open orders before running
 CANCEL_ALL_FIRST = False
 
@@ -236,8 +418,188 @@ RUN_ORDER_PAGE_UPDATE = True
 # <-- Set to True when you want to run from trade file
 RUN_INLINE_TRADE_FILE = False  
 
+# Set this flag to True to trade a large .csv/.jsonl trade list (see trade_ingest.TRADE_FIELDS)
+RUN_BULK_TRADE_FILE = False
+
+# Set this flag to True to rebuild the Log sheet from the trade journal at the end of the run
+EXPORT_LOG_SHEET = False
+
+# Set this flag to True to bring the local bar history of every traded ticker up to date
+RUN_BAR_STORE_FILL = False
+
+# Set this flag to True to stay connected and process rows as soon as they are saved as TRANSMIT
+RUN_DAEMON = False
+
+# Seconds between checks of the workbook and trade file in daemon mode
+DAEMON_POLL_INTERVAL = 0.5
+
+# First and longest wait (seconds) before retrying a failed reconnect or workbook pass in daemon mode
+DAEMON_RETRY_MIN = 2
+DAEMON_RETRY_MAX = 60
+
+# Exponential backoff for a step of the daemon loop that keeps failing
+class RetryBackoff:
+    def __init__(self, first=DAEMON_RETRY_MIN, longest=DAEMON_RETRY_MAX):
+        self.first = first
+        self.longest = longest
+        self.delay = first
+        self.retry_at = 0.0
+
+    def ready(self):
+        return time.monotonic() >= self.retry_at
+
+    # Schedule the next attempt and return the wait before it
+    def failed(self):
+        delay = self.delay
+        self.retry_at = time.monotonic() + delay
+        self.delay = min(delay * 2, self.longest)
+        return delay
+
+    def succeeded(self):
+        self.delay = self.first
+        self.retry_at = 0.0
+
+# Order sheets (BUY*/SELL*) of a workbook, with column names stripped
+def read_order_sheets(sheets):
+    order_sheets = {}
+    for sheet_name, sheet_data in sheets.items():
+        if sheet_name.startswith("BUY") or sheet_name.startswith("SELL"):
+            sheet_data.columns = sheet_data.columns.str.strip()
+            order_sheets[sheet_name] = sheet_data
+    return order_sheets
+
+# Tickers of the order sheets and of current stock holdings
+def traded_tickers(order_sheets):
+    tickers = [pos.contract.symbol for pos in ib.portfolio() if pos.contract.secType == "STK"]
+    for df in order_sheets.values():
+        if "Ticker" in df.columns:
+            tickers += [str(ticker).strip().upper() for ticker in df["Ticker"].dropna()]
+    return list(dict.fromkeys(ticker for ticker in tickers if ticker))
+
+# Identity of each TRANSMIT row per sheet: (row index, ticker, order type)
+def transmit_row_keys(order_sheets):
+    keys = {}
+    for sheet_name, df in order_sheets.items():
+        if "Execution" not in df.columns or "Ticker" not in df.columns:
+            continue
+        transmit = df["Execution"].astype(str).str.strip().str.upper() == "TRANSMIT"
+        order_types = df["OrderType"] if "OrderType" in df.columns else pd.Series("", index=df.index)
+        keys[sheet_name] = {
+            (index, str(df.at[index, "Ticker"]).strip().upper(), str(order_types[index]).strip().upper()): index
+            for index in df.index[transmit]
+        }
+    return keys
+
+# Modification time of a file, or None if it does not exist
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+# Handle rows that became TRANSMIT since the last look at the workbook; seen_rows is updated in place
+def process_new_transmit_rows(seen_rows):
+    session = open_workbook_session()
+    try:
+        order_sheets = read_order_sheets(session.read())
+        current = transmit_row_keys(order_sheets)
+        new_rows = {
+            sheet_name: [index for key, index in keys.items() if key not in seen_rows.get(sheet_name, {})]
+            for sheet_name, keys in current.items()
+        }
+        if any(new_rows.values()):
+            logger.info(f"New TRANSMIT rows: {sum(len(rows) for rows in new_rows.values())}")
+            process_sheets({name: order_sheets[name] for name, rows in new_rows.items() if rows}, new_rows)
+    finally:
+        commit_workbook_session()
+    # Rows only count as seen once they were handled and saved, so a failed pass is retried next poll
+    seen_rows.clear()
+    seen_rows.update(current)
+
+# Reconnect after the IB connection dropped; False (after logging) while the gateway is unreachable
+def reconnect_ibkr():
+    logger.warning("IB connection lost, reconnecting")
+    try:
+        init_ibkr_connection(Trading_Mode)
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.error(f"Reconnect failed: {e!r}")
+        return False
+    if not ib.isConnected():
+        logger.error("Reconnect failed")
+        return False
+    logger.info("✅ Reconnected to IB")
+    return True
+
+# Resident mode: keep the IB connection and its caches alive, watch the workbook and trade file,
+# and handle only rows newly saved as TRANSMIT and entries newly added to the trade file.
+# Entries already in the trade file at start-up are treated as handled. A dropped connection is
+# retried with backoff, and so is a workbook pass that failed (e.g. while the file is open in Excel)
+# unless the workbook is saved again in the meantime.
+def run_daemon(trade_file_path="Trade_File.txt"):
+    seen_rows = {}
+    seen_trades = set()
+    baseline = read_inline_trades(trade_file_path) or {}
+    seen_trades.update(inline_trade_key(mode, item) for mode in ["BUY", "SELL"] for item in baseline.get(mode, []))
+    workbook_mtime = None
+    failed_mtime = None  # workbook mtime of the last failed pass
+    trade_file_mtime = file_mtime(trade_file_path)
+    reconnect_backoff = RetryBackoff()
+    workbook_backoff = RetryBackoff()
+    logger.info(f"👀 Watching {excel_file} and {trade_file_path} for new TRANSMIT rows (Ctrl+C to stop)")
+
+    try:
+        while True:
+            if not ib.isConnected():
+                if not reconnect_backoff.ready():
+                    ib.sleep(DAEMON_POLL_INTERVAL)
+                    continue
+                if not reconnect_ibkr():
+                    logger.info(f"Retrying the connection in {reconnect_backoff.failed():.0f}s")
+                    continue
+                reconnect_backoff.succeeded()
+
+            changed = False
+            mtime = file_mtime(excel_file)
+            if mtime != workbook_mtime and (mtime != failed_mtime or workbook_backoff.ready()):
+                changed = True
+                try:
+                    process_new_transmit_rows(seen_rows)
+                    workbook_mtime = file_mtime(excel_file)
+                    failed_mtime = None
+                    workbook_backoff.succeeded()
+                except Exception as e:
+                    failed_mtime = mtime
+                    logger.error(f"Could not process workbook changes, retrying in {workbook_backoff.failed():.0f}s: {e}")
+
+            mtime = file_mtime(trade_file_path)
+            if mtime != trade_file_mtime:
+                changed = True
+                trade_file_mtime = mtime
+                open_workbook_session()
+                try:
+                    process_inline_trades(trade_file_path, seen_trades)
+                except Exception as e:
+                    logger.error(f"Could not process trade file changes: {e}")
+                finally:
+                    commit_workbook_session()
+
+            if changed:
+                export_run_metrics()
+                reset_run()
+            ib.sleep(DAEMON_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        logger.info("Daemon stopped.")
+
 # Run logic
 def run():
+    if RUN_DAEMON:
+        try:
+            run_daemon("Trade_File.txt")
+        finally:
+            disconnect_ibkr()
+        return
+
+    session = open_workbook_session()
     try:
         if CANCEL_ALL_FIRST:
             cancel_all_open_orders()
@@ -254,18 +616,28 @@ def run():
             logger.info("Updated Orders with holdings with Buy_Usual and SELL sheet.")
             return
         
+        if RUN_BULK_TRADE_FILE:
+            process_bulk_trades(BULK_TRADE_FILE)
+            return
+
+        if RUN_BAR_STORE_FILL:
+            fill_bar_store(traded_tickers(read_order_sheets(session.read())))
+            return
+
         if RUN_INLINE_TRADE_FILE:
             process_inline_trades("Trade_File.txt")
             logger.info("✅ Processed inline trades from trade file.")
             return
         
-        sheets = pd.read_excel(excel_file, sheet_name=None)
-        for sheet_name, sheet_data in sheets.items():
-            if sheet_name.startswith("BUY") or sheet_name.startswith("SELL"):
-                sheet_data.columns = sheet_data.columns.str.strip()
-                process_sheet(sheet_name, sheet_data)
+        process_sheets(read_order_sheets(session.read()))
     finally:
-        ib.disconnect()
+        try:
+            if EXPORT_LOG_SHEET:
+                export_log_sheet()
+            commit_workbook_session()
+        finally:
+            export_run_metrics()
+            disconnect_ibkr()
 
 if __name__ == "__main__":
     run()
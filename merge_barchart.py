@@ -1,6 +1,10 @@
 import pandas as pd
 import os
+import sys
+from datetime import datetime
 from openpyxl import load_workbook
+from screener_data import load_day
+from screener_rules import apply_rule_set
 
 # Define file paths
 base_path = r"C:\Users\jyoti\Downloads"
@@ -8,46 +12,20 @@ output_path = r"C:\Users\jyoti\Downloads\Stocks\IBKR_Trader\PaperTrading"
 output_file = os.path.join(output_path, "merged_intraday.csv")
 orders_file = os.path.join(output_path, "Orders_PaperTrading.xlsx")
 
-# List of input files to merge
-input_files = [
-    "top-1-signal-strength-intraday-04-24-2025.csv",
-    "top-1-signal-direction-intraday-04-24-2025.csv",
-    "top-stocks-to-own-intraday-04-24-2025.csv",
-    "all-us-exchanges-price-volume-leaders-04-24-2025.csv"
-]
+# Day of the Barchart exports to merge (MM-DD-YYYY as in the file names), today unless given
+screener_day = sys.argv[1] if len(sys.argv) > 1 else datetime.today().strftime("%m-%d-%Y")
 
-# Read and concatenate all files
-dfs = []
-for file in input_files:
-    full_path = os.path.join(base_path, file)
-    df = pd.read_csv(full_path)
-    dfs.append(df)
-
-merged_df = pd.concat(dfs, ignore_index=True)
-
-# Drop duplicates based on the Symbol column
-if "Symbol" in merged_df.columns:
-    merged_df = merged_df.drop_duplicates(subset=["Symbol"])
-else:
-    raise ValueError("❌ 'Symbol' column not found in input files.")
-
-# Sort by Price Vol column if it exists
-if "Price Vol" in merged_df.columns:
-    merged_df = merged_df.sort_values(by="Price Vol", ascending=False)
-else:
-    raise ValueError("❌ 'Price Vol' column not found in input files.")
+# Read the day's exports (cached as Parquet after the first read); one row per symbol,
+# keeping the row with the highest Price Vol, sorted by Price Vol
+merged_df = load_day(base_path, screener_day)
 
 # Save the final output
 merged_df.to_csv(output_file, index=False)
 print(f"✅ Merged, deduplicated, and sorted file saved to: {output_file}")
 
 # Filter symbols for buying recommendation
-buy_candidates = merged_df[
-    (merged_df["Short Term"] == "100% Buy") &
-    (merged_df["Medium Term"] == "100% Buy") &
-    (merged_df["Long Term"] == "100% Buy") &
-    (merged_df["# Analysts"] > 5)
-]
+# ("barchart_strong_buy" in screener_rules.json: 100% Buy on all terms, more than 5 analysts)
+buy_candidates = apply_rule_set(merged_df, "barchart_strong_buy")
 buy_candidate_symbols = set(buy_candidates["Symbol"].str.upper())
 
 # Load existing BUY_Usual sheet
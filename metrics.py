@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import logging
+import functools
+import inspect
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Where run metrics are exported
+METRICS_DIR = os.getenv("IBKR_METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"))
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Current run (or daemon pass): reset by reset_run
+_durations = {}  # stage -> [seconds]
+_errors = {}  # stage -> count
+_spans = []  # (stage, ticker, start, duration, ok)
+_run_started = time.time()
+
+# Since the process started, for the Prometheus counters
+_histograms = {}  # stage -> [count per bucket of LATENCY_BUCKETS, +Inf count, sum]
+_error_totals = {}  # stage -> count
+
+# Record one timed call of a stage
+def record(stage, duration, ticker=None, ok=True, start=None):
+    _durations.setdefault(stage, []).append(duration)
+    histogram = _histograms.setdefault(stage, [0] * len(LATENCY_BUCKETS) + [0, 0.0])
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if duration <= bound:
+            histogram[i] += 1
+    histogram[-2] += 1
+    histogram[-1] += duration
+    if not ok:
+        _errors[stage] = _errors.get(stage, 0) + 1
+        _error_totals[stage] = _error_totals.get(stage, 0) + 1
+    _spans.append((stage, ticker, start if start is not None else time.time() - duration, duration, ok))
+
+# Time a block of code as one span of a stage
+@contextmanager
+def timed(stage, ticker=None):
+    start = time.time()
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        record(stage, time.perf_counter() - started, ticker, ok, start)
+
+# Ticker of a call, read from its argument named ticker_arg: a symbol, or a contract or trade carrying one
+def _span_ticker(position, ticker_arg, args, kwargs):
+    if ticker_arg is None:
+        return None
+    value = args[position] if position < len(args) else kwargs.get(ticker_arg)
+    if isinstance(value, str):
+        return value
+    symbol = getattr(getattr(value, "contract", value), "symbol", None)
+    return symbol if isinstance(symbol, str) else None
+
+# Decorator that times every call of a sync or async function as a stage. Spans are tagged with the
+# ticker from the argument named ticker (a symbol, contract or trade); without it they carry no ticker.
+def instrument(stage, ticker=None):
+    def decorator(func):
+        position = list(inspect.signature(func).parameters).index(ticker) if ticker is not None else 0
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage, _span_ticker(position, ticker, args, kwargs)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage, _span_ticker(position, ticker, args, kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Value at the given percentile (0-100) of a list of durations
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[rank]
+
+# Per-stage count, error count, p50, p99 and max in seconds over the current run
+def summary():
+    return {
+        stage: {
+            "count": len(values),
+            "errors": _errors.get(stage, 0),
+            "p50": percentile(values, 50),
+            "p99": percentile(values, 99),
+            "max": max(values),
+        }
+        for stage, values in sorted(_durations.items())
+    }
+
+# Stage histograms since the process started, in Prometheus text exposition format (for the node_exporter
+# textfile collector)
+def prometheus_text():
+    lines = [
+        "# HELP ibkr_stage_latency_seconds Latency of trading stages.",
+        "# TYPE ibkr_stage_latency_seconds histogram",
+    ]
+    for stage, histogram in sorted(_histograms.items()):
+        *buckets, count, total = histogram
+        for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+            lines.append(f'ibkr_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {bucket}')
+        lines.append(f'ibkr_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'ibkr_stage_latency_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'ibkr_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+    lines.append("# HELP ibkr_stage_errors_total Calls of a stage that raised.")
+    lines.append("# TYPE ibkr_stage_errors_total counter")
+    for stage in sorted(_histograms):
+        lines.append(f'ibkr_stage_errors_total{{stage="{stage}"}} {_error_totals.get(stage, 0)}')
+    lines.append("# HELP ibkr_run_timestamp_seconds When these metrics were exported.")
+    lines.append("# TYPE ibkr_run_timestamp_seconds gauge")
+    lines.append(f"ibkr_run_timestamp_seconds {time.time():.0f}")
+    return "\n".join(lines) + "\n"
+
+# Spans as a Chrome/Perfetto trace (one track per ticker)
+def trace_events():
+    tracks = {}
+    events = []
+    for stage, ticker, start, duration, ok in _spans:
+        track = tracks.setdefault(ticker or "-", len(tracks) + 1)
+        events.append({
+            "name": stage, "cat": "ok" if ok else "error", "ph": "X",
+            "ts": int((start - _run_started) * 1_000_000), "dur": int(duration * 1_000_000),
+            "pid": 1, "tid": track, "args": {"ticker": ticker},
+        })
+    for ticker, track in tracks.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": track, "args": {"name": ticker}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+# Write the Prometheus file, the JSON trace and one summary line for tracking p50/p99 over days
+def export_run_metrics(metrics_dir=METRICS_DIR):
+    if not _durations:
+        return
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        prom_file = os.path.join(metrics_dir, "ibkr_trader.prom")
+        with open(f"{prom_file}.tmp", "w") as file:
+            file.write(prometheus_text())
+        os.replace(f"{prom_file}.tmp", prom_file)
+        with open(os.path.join(metrics_dir, f"trace-{stamp}.json"), "w") as file:
+            json.dump(trace_events(), file)
+        with open(os.path.join(metrics_dir, "history.jsonl"), "a") as file:
+            file.write(json.dumps({"run": stamp, "stages": summary()}) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not export run metrics: {e}")
+        return
+    for stage, stats in summary().items():
+        logger.info(f"⏱️ {stage:<24} n={stats['count']:<4} p50={stats['p50'] * 1000:8.1f}ms "
+                    f"p99={stats['p99'] * 1000:8.1f}ms errors={stats['errors']}")
+
+# Start a fresh run: spans and the per-run durations behind summary() are cleared, while the
+# Prometheus histograms and error counters keep accumulating
+def reset_run():
+    global _run_started
+    _durations.clear()
+    _errors.clear()
+    _spans.clear()
+    _run_started = time.time()
@@ -0,0 +1,67 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which an order no longer works at the broker
+DONE_STATUSES = ("Filled", "Cancelled", "ApiCancelled", "Inactive")
+
+# Normalize a symbol so sheet tickers (BRK.B) and IB symbols (BRK B) share one key
+def normalize_symbol(symbol):
+    return str(symbol).strip().upper().replace(" ", ".")
+
+# Live index of working orders by symbol and order type, kept current from IB's order events
+# so lookups and "cancel all for X" need no reqOpenOrders round trip or rescan of ib.trades()
+class OrderIndex:
+    def __init__(self, ib):
+        self.ib = ib
+        self._orders = {}  # symbol -> order type -> {id(trade): trade}
+        self._seeded = False
+        ib.newOrderEvent += self._on_trade
+        ib.openOrderEvent += self._on_trade
+        ib.orderStatusEvent += self._on_trade
+        ib.disconnectedEvent += self._on_disconnected
+
+    # Add or drop a trade as its state changes
+    def _on_trade(self, trade):
+        symbol = normalize_symbol(trade.contract.symbol)
+        by_type = self._orders.setdefault(symbol, {}).setdefault(trade.order.orderType, {})
+        if trade.orderStatus.status in DONE_STATUSES:
+            by_type.pop(id(trade), None)
+        else:
+            by_type[id(trade)] = trade
+
+    # The trades of a dropped session are not updated anymore; the next session's are seeded afresh
+    def _on_disconnected(self):
+        self._orders.clear()
+        self._seeded = False
+
+    # Pick up orders that were already open before the index subscribed (synced on connect)
+    def _seed(self):
+        if not self._seeded and self.ib.isConnected():
+            for trade in self.ib.openTrades():
+                self._on_trade(trade)
+            self._seeded = True
+            logger.info(f"Order index seeded with {len(self.ib.openTrades())} open orders")
+
+    # Working trades for a symbol, optionally limited to some order types
+    def active(self, symbol, order_types=None):
+        self._seed()
+        by_type = self._orders.get(normalize_symbol(symbol), {})
+        types = order_types if order_types is not None else list(by_type)
+        return [
+            trade
+            for order_type in types
+            for trade in by_type.get(order_type, {}).values()
+            if trade.orderStatus.status not in DONE_STATUSES
+        ]
+
+    # Trailing percent of the working TRAIL LIMIT order for a symbol, or None
+    def trail_percent(self, symbol):
+        for trade in self.active(symbol, ["TRAIL LIMIT"]):
+            return trade.order.trailingPercent
+        return None
+
+    # Symbols with at least one working order
+    def symbols(self):
+        self._seed()
+        return [symbol for symbol, by_type in self._orders.items() if any(by_type.values())]
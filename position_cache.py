@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from order_index import normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a position to reflect a fill before returning what is known
+POSITION_SETTLE_TIMEOUT = 5
+
+# Positions by symbol and secType, kept current from IB's portfolio and position events so
+# close and attach flows read quantities immediately instead of sleeping and scanning ib.portfolio()
+class PositionCache:
+    def __init__(self, ib):
+        self.ib = ib
+        self._positions = {}  # (symbol, secType) -> {account: position}
+        self._waiters = {}  # (symbol, secType) -> [(expected, future)]
+        self._seeded = False
+        ib.updatePortfolioEvent += self._on_update
+        ib.positionEvent += self._on_update
+        ib.disconnectedEvent += self._on_disconnected
+
+    # Store a PortfolioItem or Position update and wake anyone waiting for that quantity
+    def _on_update(self, item):
+        key = (normalize_symbol(item.contract.symbol), item.contract.secType)
+        self._positions.setdefault(key, {})[item.account] = item.position
+        waiters = self._waiters.get(key)
+        if waiters:
+            quantity = self._quantity(key)
+            for expected, future in list(waiters):
+                if quantity == expected and not future.done():
+                    future.set_result(quantity)
+            self._waiters[key] = [(e, f) for e, f in waiters if not f.done()]
+
+    # Positions may change while disconnected; the next session's are seeded afresh
+    def _on_disconnected(self):
+        self._positions.clear()
+        self._seeded = False
+
+    # Pick up positions that were synced on connect, before the cache subscribed
+    def _seed(self):
+        if not self._seeded and self.ib.isConnected():
+            for pos in self.ib.positions():
+                self._on_update(pos)
+            self._seeded = True
+
+    def _quantity(self, key):
+        return sum(self._positions.get(key, {}).values())
+
+    # Current position for a symbol
+    def get(self, symbol, sec_type="STK"):
+        self._seed()
+        return self._quantity((normalize_symbol(symbol), sec_type))
+
+    # Wait until the position for a symbol reaches the expected quantity, e.g. after a fill;
+    # returns the position at that point, or the latest known position once the timeout passes
+    async def settled_async(self, symbol, expected, sec_type="STK", timeout=POSITION_SETTLE_TIMEOUT):
+        key = (normalize_symbol(symbol), sec_type)
+        self._seed()
+        if self._quantity(key) == expected:
+            return expected
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(key, []).append((expected, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            quantity = self._quantity(key)
+            logger.info(f"{symbol}: position is {quantity} after {timeout}s (expected {expected})")
+            return quantity
+        finally:
+            self._waiters[key] = [(e, f) for e, f in self._waiters.get(key, []) if f is not future]
@@ -0,0 +1,111 @@
+import math
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from order_index import normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+# Streaming market-data lines to hold at once; IB accounts start with 100, keep some headroom
+QUOTE_CACHE_MAX_LINES = 90
+
+# Default maximum age (seconds) of a quote read from memory
+QUOTE_MAX_AGE = 60
+
+# A usable price from a ticker, preferring the last trade
+def ticker_price(market_data):
+    for price in (market_data.last, market_data.close, market_data.ask, market_data.bid):
+        if price and not math.isnan(price) and price > 0:
+            return price
+    return None
+
+# Shared cache of streaming quotes for the active working set. Each symbol is subscribed once with
+# reqMktData (no snapshot) and read from memory afterwards; when the line limit is reached the least
+# recently used symbol is unsubscribed. Subscriptions die with the connection, so the cache is
+# emptied when it drops.
+class QuoteCache:
+    def __init__(self, ib, pacer=None, max_lines=QUOTE_CACHE_MAX_LINES):
+        self.ib = ib
+        self.pacer = pacer
+        self.max_lines = max_lines
+        self._tickers = OrderedDict()  # symbol -> Ticker, least recently used first
+        self._requested = {}  # symbol -> time of its latest reqMktData
+        ib.disconnectedEvent += self._on_disconnected
+
+    def __contains__(self, symbol):
+        return normalize_symbol(symbol) in self._tickers
+
+    # Subscribe to streaming data for contracts not yet in the cache ({symbol: contract}). A cached
+    # symbol whose last update is older than max_age seconds is requested again, since its line has
+    # stopped updating.
+    async def subscribe_async(self, contracts, max_age=None):
+        for symbol, contract in contracts.items():
+            symbol = normalize_symbol(symbol)
+            if symbol in self._tickers:
+                age = self.age(symbol)
+                if max_age is None or age is None or age <= max_age:
+                    self._tickers.move_to_end(symbol)
+                    continue
+                logger.info(f"Quote for {symbol} is {age:.0f}s old, requesting it again")
+                self.ib.cancelMktData(self._tickers.pop(symbol).contract)
+            while len(self._tickers) >= self.max_lines:
+                self._evict()
+            if self.pacer:
+                await self.pacer.acquire()
+            self._requested[symbol] = datetime.now(timezone.utc)
+            self._tickers[symbol] = self.ib.reqMktData(contract, "", False, False)
+
+    # Drop the least recently used subscription
+    def _evict(self):
+        symbol, market_data = self._tickers.popitem(last=False)
+        self._requested.pop(symbol, None)
+        self.ib.cancelMktData(market_data.contract)
+        logger.debug(f"Unsubscribed idle quote for {symbol}")
+
+    # Forget every subscription of a dropped connection (there is nothing left to cancel)
+    def _on_disconnected(self):
+        if self._tickers:
+            logger.info(f"Connection lost, dropping {len(self._tickers)} quote subscriptions")
+        self._tickers.clear()
+        self._requested.clear()
+
+    # Seconds since the last update of a subscribed symbol, or None if nothing was received yet
+    def age(self, symbol):
+        market_data = self._tickers.get(normalize_symbol(symbol))
+        if market_data is None or market_data.time is None:
+            return None
+        return (datetime.now(timezone.utc) - market_data.time).total_seconds()
+
+    # Latest last/bid/ask/close for a symbol, or None if not subscribed or older than max_age seconds.
+    # With fresh=True, only an update received after the symbol's latest request counts.
+    def quote(self, symbol, max_age=QUOTE_MAX_AGE, fresh=False):
+        symbol = normalize_symbol(symbol)
+        market_data = self._tickers.get(symbol)
+        if market_data is None:
+            return None
+        age = self.age(symbol)
+        if max_age is not None and (age is None or age > max_age):
+            return None
+        if fresh and (market_data.time is None or market_data.time < self._requested.get(symbol, market_data.time)):
+            return None
+        self._tickers.move_to_end(symbol)
+        return {
+            "last": market_data.last,
+            "bid": market_data.bid,
+            "ask": market_data.ask,
+            "close": market_data.close,
+            "time": market_data.time,
+        }
+
+    # Usable price for a symbol, or None if not subscribed, stale or not priced yet
+    def price(self, symbol, max_age=QUOTE_MAX_AGE, fresh=False):
+        symbol = normalize_symbol(symbol)
+        market_data = self._tickers.get(symbol)
+        if market_data is None or self.quote(symbol, max_age, fresh) is None:
+            return None
+        return ticker_price(market_data)
+
+    # Cancel every subscription
+    def clear(self):
+        while self._tickers:
+            self._evict()
@@ -0,0 +1,114 @@
+import logging
+import pandas as pd
+from engine import PRIORITY_CANCEL, PRIORITY_PROTECT, PRIORITY_ENTRY
+
+logger = logging.getLogger(__name__)
+
+# Order types a sheet row can ask for
+ORDER_TYPES = ("MKT", "MKT-ATCH-LIMIT", "LMT-ATTCH-TRAIL-LIMIT", "ATCH-LMT", "CLOSE", "REMOVE-LIMIT-ORDER")
+
+# Order types that buy or sell a size given by Quantity or, when that is blank, Amount
+SIZED_ORDER_TYPES = ("MKT", "MKT-ATCH-LIMIT", "LMT-ATTCH-TRAIL-LIMIT")
+
+# Order types that attach a trailing limit and so need a trailing percent
+TRAILING_ORDER_TYPES = ("MKT-ATCH-LIMIT", "LMT-ATTCH-TRAIL-LIMIT", "ATCH-LMT")
+
+DEFAULT_TRAIL_LIMIT_PERCENT = 4.0
+
+# Scheduling class of each order type: rows that take risk off go first, then rows that protect a
+# position, then new entries
+ORDER_TYPE_PRIORITY = {
+    "REMOVE-LIMIT-ORDER": PRIORITY_CANCEL,
+    "CLOSE": PRIORITY_CANCEL,
+    "ATCH-LMT": PRIORITY_PROTECT,
+    "MKT": PRIORITY_ENTRY,
+    "MKT-ATCH-LIMIT": PRIORITY_ENTRY,
+    "LMT-ATTCH-TRAIL-LIMIT": PRIORITY_ENTRY,
+}
+
+# One validated TRANSMIT row, ready for the executor
+class PlannedRow:
+    __slots__ = ("sheet", "index", "symbol", "order_type", "action", "amount", "quantity", "trail_percent")
+
+    def __init__(self, sheet, index, symbol, order_type, action, amount, quantity, trail_percent):
+        self.sheet = sheet
+        self.index = index
+        self.symbol = symbol
+        self.order_type = order_type
+        self.action = action
+        self.amount = amount
+        self.quantity = quantity
+        self.trail_percent = trail_percent
+
+    def __repr__(self):
+        return f"PlannedRow({self.sheet}[{self.index}] {self.order_type} {self.action} {self.symbol})"
+
+def _text_column(df, column):
+    if column not in df.columns:
+        return pd.Series("", index=df.index)
+    return df[column].fillna("").astype(str).str.strip().str.upper()
+
+def _number_column(df, column):
+    if column not in df.columns:
+        return pd.Series(float("nan"), index=df.index), pd.Series(False, index=df.index)
+    raw = df[column]
+    numbers = pd.to_numeric(raw, errors="coerce")
+    blank = raw.isna() | raw.astype(str).str.strip().eq("")
+    return numbers, numbers.isna() & ~blank
+
+# Validate and normalize the TRANSMIT rows of a sheet with column operations. Returns the planned
+# rows in sheet order and a Series of rejection reasons indexed by row. When rows is given, only those
+# row indexes are considered. Exact repeats of the same order on the same ticker are rejected as
+# duplicates of their first occurrence; repeated REMOVE-LIMIT-ORDER rows are kept, and process_sheets
+# merges the ones that follow one another for a ticker into one cancel, as it does across sheets.
+def plan_sheet(sheet_name, df, rows=None):
+    transmit = _text_column(df, "Execution") == "TRANSMIT"
+    if rows is not None:
+        transmit &= df.index.isin(list(rows))
+    if not transmit.any():
+        return [], pd.Series(dtype=object)
+    sheet = df.loc[transmit]
+
+    symbol = _text_column(sheet, "Ticker")
+    order_type = _text_column(sheet, "OrderType")
+    quantity, bad_quantity = _number_column(sheet, "Quantity")
+    amount, bad_amount = _number_column(sheet, "Amount")
+    trail_percent, bad_trail = _number_column(sheet, "TrailLimit%")
+    trail_percent = trail_percent.fillna(DEFAULT_TRAIL_LIMIT_PERCENT)
+
+    reasons = pd.Series(pd.NA, index=sheet.index, dtype=object)
+    checks = [
+        (symbol.isin(["", "NAN", "NONE"]), "missing ticker"),
+        (~order_type.isin(ORDER_TYPES), "unknown order type"),
+        (bad_quantity | (quantity.notna() & ((quantity <= 0) | (quantity % 1 != 0))), "quantity must be a positive whole number"),
+        (bad_amount | (amount < 0), "amount must be a positive number"),
+        (order_type.isin(SIZED_ORDER_TYPES) & quantity.isna() & ~(amount > 0), "needs a quantity or an amount"),
+        (order_type.isin(TRAILING_ORDER_TYPES) & (bad_trail | ~(trail_percent > 0)), "trail limit % must be a positive number"),
+        ((order_type == "REMOVE-LIMIT-ORDER") & quantity.notna(), "quantity must be blank for REMOVE-LIMIT-ORDER"),
+    ]
+    for failed, reason in checks:
+        reasons = reasons.mask(failed & reasons.isna(), reason)
+
+    valid = reasons.isna()
+    key = pd.DataFrame({"symbol": symbol, "order_type": order_type, "quantity": quantity, "amount": amount})[valid]
+    duplicate = key.duplicated() & (key["order_type"] != "REMOVE-LIMIT-ORDER")
+    reasons.loc[duplicate[duplicate].index] = "duplicate row"
+    valid = reasons.isna()
+
+    action = "BUY" if sheet_name.startswith("BUY") else "SELL"
+    quantity = quantity.astype(object).where(quantity.notna(), None)
+    amount = amount.fillna(0.0)
+    planned = [
+        PlannedRow(sheet_name, index, sym, kind, action, float(amt), None if qty is None else int(qty), float(pct))
+        for index, sym, kind, qty, amt, pct in zip(
+            sheet.index[valid], symbol[valid], order_type[valid], quantity[valid], amount[valid], trail_percent[valid]
+        )
+    ]
+
+    rejected = reasons[~valid]
+    if len(planned):
+        counts = pd.Series([row.order_type for row in planned]).value_counts()
+        logger.info(f"{sheet_name}: planned {len(planned)} rows ({', '.join(f'{k} {v}' for k, v in counts.items())})")
+    for reason, indexes in rejected.groupby(rejected).groups.items():
+        logger.error(f"{sheet_name}: rejected {len(indexes)} rows ({reason}): {', '.join(map(str, indexes))}")
+    return planned, rejected
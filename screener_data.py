@@ -0,0 +1,114 @@
+import os
+import glob
+import logging
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Barchart exports of one day, matched per day (MM-DD-YYYY as in the file names)
+BARCHART_FILE_PATTERNS = (
+    "top-*-intraday-{day}.csv",
+    "all-us-exchanges-price-volume-leaders-{day}.csv",
+)
+
+# Columns read from the exports and how they are typed; anything else in the files is skipped
+TEXT_COLUMNS = ["Symbol", "Name"]
+RATING_COLUMNS = ["Short Term", "Medium Term", "Long Term"]
+NUMERIC_COLUMNS = ["Market Cap", "Last", "Mean Target", "Analyst Rating", "# Analysts", "Price Vol"]
+PERCENT_COLUMNS = ["%Chg", "5D %Chg", "20D %Chg", "100D %Chg"]
+SCREENER_COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS + PERCENT_COLUMNS + RATING_COLUMNS + ["Latest Earnings"]
+
+# Parsed days are cached here as one Parquet file per day
+SCREENER_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "screener_cache")
+
+# Export files of one day in base_path
+def find_day_files(base_path, day, patterns=BARCHART_FILE_PATTERNS):
+    files = set()
+    for pattern in patterns:
+        files.update(glob.glob(os.path.join(base_path, pattern.format(day=day))))
+    return sorted(files)
+
+# Read one export with only the screener columns, everything as text first, then typed column by column
+# (percent columns become numbers in percent units, e.g. "+9.09%" -> 9.09)
+def read_export(path):
+    df = pd.read_csv(path, usecols=lambda column: column in SCREENER_COLUMNS, dtype=str, skipinitialspace=True)
+    df = df[df["Symbol"].notna() & ~df["Symbol"].str.startswith("Downloaded from")]
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column].str.replace(",", "", regex=False), errors="coerce")
+    for column in PERCENT_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column].str.replace(r"[%,+]", "", regex=True), errors="coerce")
+    if "Latest Earnings" in df.columns:
+        df["Latest Earnings"] = pd.to_datetime(df["Latest Earnings"], errors="coerce")
+    df["Symbol"] = df["Symbol"].str.strip().str.upper()
+    df["Source"] = os.path.basename(path)
+    return df.reindex(columns=SCREENER_COLUMNS + ["Source"])
+
+# Keep one row per symbol: the one with the highest Price Vol (ties keep the earlier file), sorted by Price Vol
+def dedupe_by_price_volume(df):
+    ranked = df.sort_values("Price Vol", ascending=False, kind="stable", na_position="last")
+    return ranked.drop_duplicates("Symbol").reset_index(drop=True)
+
+def _cache_file(cache_dir, day):
+    return os.path.join(cache_dir, f"{day}.parquet")
+
+def _read_cache(cache_file, files):
+    try:
+        if not os.path.exists(cache_file) or os.path.getmtime(cache_file) < max(map(os.path.getmtime, files)):
+            return None
+        cached = pd.read_parquet(cache_file)
+    except (ImportError, OSError, ValueError) as e:
+        logger.warning(f"Could not read screener cache {cache_file}: {e}")
+        return None
+    if set(cached["Source"].unique()) != {os.path.basename(path) for path in files}:
+        return None
+    return cached
+
+def _write_cache(cache_file, df):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = f"{cache_file}.tmp"
+        df.to_parquet(temp_file, index=False)
+        os.replace(temp_file, cache_file)
+    except (ImportError, OSError, ValueError) as e:
+        logger.warning(f"Could not write screener cache {cache_file}: {e}")
+
+# All export rows of one day (with their Source file), from the Parquet cache while it is newer than the
+# exports, otherwise read in parallel and cached
+def load_day_rows(base_path, day, cache_dir=SCREENER_CACHE_DIR, patterns=BARCHART_FILE_PATTERNS):
+    files = find_day_files(base_path, day, patterns)
+    if not files:
+        raise FileNotFoundError(f"No Barchart exports for {day} in {base_path}")
+    cache_file = _cache_file(cache_dir, day)
+    cached = _read_cache(cache_file, files)
+    if cached is not None:
+        return cached
+    with ThreadPoolExecutor(max_workers=len(files)) as pool:
+        frames = list(pool.map(read_export, files))
+    rows = pd.concat(frames, ignore_index=True)
+    for column in RATING_COLUMNS + ["Source"]:
+        rows[column] = rows[column].astype("category")
+    _write_cache(cache_file, rows)
+    logger.info(f"Parsed {len(rows)} rows from {len(files)} exports for {day}")
+    return rows
+
+# One row per symbol for a day, deduplicated by highest Price Vol
+def load_day(base_path, day, cache_dir=SCREENER_CACHE_DIR, patterns=BARCHART_FILE_PATTERNS):
+    return dedupe_by_price_volume(load_day_rows(base_path, day, cache_dir, patterns))
+
+# Deduplicated screener rows of many days stacked in one frame, with a Day column
+def load_days(base_path, days, cache_dir=SCREENER_CACHE_DIR, patterns=BARCHART_FILE_PATTERNS):
+    frames = []
+    for day in days:
+        try:
+            frames.append(load_day(base_path, day, cache_dir, patterns).assign(Day=day))
+        except FileNotFoundError as e:
+            logger.warning(str(e))
+    if not frames:
+        return pd.DataFrame(columns=SCREENER_COLUMNS + ["Source", "Day"])
+    stacked = pd.concat(frames, ignore_index=True)
+    for column in RATING_COLUMNS + ["Day"]:
+        stacked[column] = stacked[column].astype("category")
+    return stacked
@@ -0,0 +1,127 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Named rule sets: each is a list of conditions that must all hold, e.g.
+# {"column": "Short Term", "contains": ["Buy", "Hold"]} or {"column": "# Analysts", "gte": 20}
+SCREENER_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "screener_rules.json")
+
+# Operators on text columns, evaluated once per distinct value; contains is a case-insensitive
+# substring match against one value or any of a list
+TEXT_OPERATORS = ("eq", "ne", "in", "not_in", "contains")
+
+# Operators on numeric columns; text that does not parse as a number never matches
+NUMERIC_OPERATORS = ("gt", "gte", "lt", "lte", "between")
+
+def load_rule_sets(path=SCREENER_RULES_FILE):
+    with open(path, "r") as file:
+        rule_sets = json.load(file)
+    for name, conditions in rule_sets.items():
+        for condition in conditions:
+            operators = [key for key in condition if key != "column"]
+            if "column" not in condition or len(operators) != 1 or operators[0] not in TEXT_OPERATORS + NUMERIC_OPERATORS:
+                raise ValueError(f"Rule set {name}: invalid condition {condition}")
+    return rule_sets
+
+# Copies of a rule set with one threshold swept over values, named "<name>[<column> <op> <value>]"
+def threshold_variants(rule_sets, name, column, operator, values):
+    variants = {}
+    for value in values:
+        conditions = [
+            {"column": column, operator: value} if c.get("column") == column and operator in c else c
+            for c in rule_sets[name]
+        ]
+        variants[f"{name}[{column} {operator} {value}]"] = conditions
+    return variants
+
+def _text_match(values, operator, operand):
+    values = values.astype(str)
+    if operator == "eq":
+        return values == str(operand)
+    if operator == "ne":
+        return values != str(operand)
+    if operator in ("in", "not_in"):
+        found = np.isin(values, [str(item) for item in operand])
+        return found if operator == "in" else ~found
+    needles = [operand] if isinstance(operand, str) else operand
+    lowered = np.char.lower(values)
+    return np.logical_or.reduce([np.char.find(lowered, needle.lower()) >= 0 for needle in needles])
+
+# Screener rows prepared for rule evaluation: text columns as categorical codes plus their distinct
+# values, numeric columns as float arrays. Each distinct condition is evaluated once and cached, so
+# rule sets sharing conditions, and many days stacked into one frame, cost one pass.
+class ScreenerFrame:
+    def __init__(self, df):
+        self.df = df
+        self._codes = {}  # column -> (codes, categories)
+        self._numbers = {}  # column -> float array
+        self._masks = {}  # condition key -> bool array
+
+    def __len__(self):
+        return len(self.df)
+
+    def _categorical(self, column):
+        if column not in self._codes:
+            values = self.df[column]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("category")
+            self._codes[column] = (values.cat.codes.to_numpy(), values.cat.categories.to_numpy(dtype=object))
+        return self._codes[column]
+
+    def _numeric(self, column):
+        if column not in self._numbers:
+            self._numbers[column] = pd.to_numeric(self.df[column], errors="coerce").to_numpy(dtype=float)
+        return self._numbers[column]
+
+    def condition_mask(self, condition):
+        column = condition["column"]
+        operator, operand = next((key, value) for key, value in condition.items() if key != "column")
+        key = (column, operator, json.dumps(operand, sort_keys=True))
+        if key in self._masks:
+            return self._masks[key]
+        if column not in self.df.columns:
+            mask = np.zeros(len(self.df), dtype=bool)
+        elif operator in TEXT_OPERATORS:
+            codes, categories = self._categorical(column)
+            # Match each distinct value once, then spread to rows by code (-1 marks missing values)
+            matches = np.append(_text_match(categories, operator, operand), operator in ("ne", "not_in"))
+            mask = matches[codes]
+        else:
+            numbers = self._numeric(column)
+            with np.errstate(invalid="ignore"):
+                if operator == "gt":
+                    mask = numbers > operand
+                elif operator == "gte":
+                    mask = numbers >= operand
+                elif operator == "lt":
+                    mask = numbers < operand
+                elif operator == "lte":
+                    mask = numbers <= operand
+                else:
+                    mask = (numbers >= operand[0]) & (numbers <= operand[1])
+        self._masks[key] = mask
+        return mask
+
+    def mask(self, conditions):
+        mask = np.ones(len(self.df), dtype=bool)
+        for condition in conditions:
+            mask &= self.condition_mask(condition)
+        return mask
+
+    # Boolean DataFrame with one column per rule set, aligned with the rows
+    def evaluate(self, rule_sets):
+        return pd.DataFrame({name: self.mask(conditions) for name, conditions in rule_sets.items()}, index=self.df.index)
+
+# Rows of df passing one named rule set
+def apply_rule_set(df, name, rule_sets=None):
+    rule_sets = rule_sets if rule_sets is not None else load_rule_sets()
+    return df[ScreenerFrame(df).mask(rule_sets[name])]
+
+# Matches per rule set and group (e.g. per day) for screener data of many days stacked in one frame
+def rule_set_counts(df, rule_sets, by="Day"):
+    masks = ScreenerFrame(df).evaluate(rule_sets)
+    return masks.groupby(df[by].to_numpy()).sum()
@@ -0,0 +1,398 @@
+import asyncio
+import logging
+import random
+import zlib
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from eventkit import Event
+from ib_insync import (
+    util, Stock, Trade, OrderStatus, Ticker, TradeLogEntry, PortfolioItem, Position,
+    Fill, Execution, CommissionReport, BarData
+)
+
+logger = logging.getLogger(__name__)
+
+# Account the simulated broker books fills to
+SIM_ACCOUNT = "DU0000000"
+
+# Calendar days per unit of an IB historical duration string ("30 D", "2 Y", ...)
+DURATION_DAYS = {"D": 1, "W": 7, "M": 31, "Y": 365}
+
+# Daily volatility of the simulated price history
+SIM_DAILY_VOLATILITY = 0.02
+
+# Statuses after which a simulated order is no longer working
+DONE_STATUSES = ("Filled", "Cancelled", "ApiCancelled", "Inactive")
+
+# Deterministic starting price for a symbol the simulation was not given a price for
+def default_price(symbol):
+    return round(20 + zlib.crc32(symbol.encode()) % 48000 / 100, 2)
+
+# Simulated market and account shared by every SimIB connection: prices, positions and orders,
+# with configurable latency, fill and rejection models
+class SimBroker:
+    def __init__(self, prices=None, positions=None, ack_latency=0.002, fill_latency=0.005,
+                 market_data_latency=0.001, reject_rate=0.0, reject_symbols=(), unknown_symbols=(),
+                 fill_market_orders=True, seed=0):
+        self.prices = {symbol.upper(): price for symbol, price in (prices or {}).items()}
+        self.positions = {}  # symbol -> [contract, position, avgCost]
+        self.ack_latency = ack_latency
+        self.fill_latency = fill_latency
+        self.market_data_latency = market_data_latency
+        self.reject_rate = reject_rate
+        self.reject_symbols = {symbol.upper() for symbol in reject_symbols}
+        self.unknown_symbols = {symbol.upper() for symbol in unknown_symbols}
+        self.fill_market_orders = fill_market_orders
+        self.random = random.Random(seed)
+        self.connections = []
+        self.trades = []
+        self.fills = []
+        self._held = {}  # (clientId, orderId) -> trade waiting for its transmitting child
+        self._next_perm_id = 1000
+        self._next_exec_id = 1
+        for symbol, quantity in (positions or {}).items():
+            symbol = symbol.upper()
+            self.positions[symbol] = [self.contract(symbol), quantity, self.price(symbol)]
+
+    def price(self, symbol):
+        return self.prices.setdefault(symbol.upper(), default_price(symbol.upper()))
+
+    def conid(self, symbol):
+        return zlib.crc32(symbol.upper().encode()) % 900000000 + 100000
+
+    # A fully qualified contract for a symbol
+    def contract(self, symbol):
+        contract = Stock(symbol, "SMART", "USD", primaryExchange="NASDAQ")
+        contract.conId = self.conid(symbol)
+        contract.localSymbol = symbol
+        return contract
+
+    def _later(self, delay, callback, *args):
+        util.getLoop().call_later(delay, callback, *args)
+
+    def _owner(self, trade):
+        for ib in self.connections:
+            if ib.clientId == trade.order.clientId:
+                return ib
+        return None
+
+    def _set_status(self, trade, status, message="", error_code=0):
+        trade.orderStatus.status = status
+        trade.log.append(TradeLogEntry(datetime.now(timezone.utc), status, message, error_code))
+        trade.statusEvent.emit(trade)
+        ib = self._owner(trade)
+        if ib:
+            ib.orderStatusEvent.emit(trade)
+            if status not in DONE_STATUSES:
+                ib.openOrderEvent.emit(trade)
+            ib.updateEvent.emit()
+
+    # Accept an order from a connection; returns the Trade the connection hands back
+    def place(self, ib, contract, order):
+        order.clientId = ib.clientId
+        if not order.orderId:
+            order.orderId = ib.client.getReqId()
+        order.permId = self._next_perm_id
+        self._next_perm_id += 1
+        trade = Trade(contract, order, OrderStatus(
+            orderId=order.orderId, status="PendingSubmit", remaining=order.totalQuantity,
+            permId=order.permId, parentId=order.parentId, clientId=ib.clientId,
+        ))
+        trade.log.append(TradeLogEntry(datetime.now(timezone.utc), "PendingSubmit", ""))
+        self.trades.append(trade)
+        ib.newOrderEvent.emit(trade)
+
+        if not order.transmit:
+            self._held[(ib.clientId, order.orderId)] = trade
+            return trade
+        parent = self._held.pop((ib.clientId, order.parentId), None) if order.parentId else None
+        if parent is not None:
+            self._later(self.ack_latency, self._acknowledge, parent)
+        self._later(self.ack_latency, self._acknowledge, trade)
+        return trade
+
+    def _acknowledge(self, trade):
+        if trade.orderStatus.status in DONE_STATUSES:
+            return
+        symbol = trade.contract.symbol.upper()
+        if symbol in self.reject_symbols or self.random.random() < self.reject_rate:
+            self._set_status(trade, "Inactive", "Order rejected - reason: simulated rejection", 201)
+            return
+        order = trade.order
+        if order.orderType == "TRAIL LIMIT" or order.parentId:
+            self._set_status(trade, "PreSubmitted")
+            return
+        self._set_status(trade, "Submitted")
+        if order.orderType == "MKT" and self.fill_market_orders:
+            self._later(self.fill_latency, self._fill, trade, self.price(symbol))
+        elif order.orderType == "LMT":
+            price = self.price(symbol)
+            if (order.action == "BUY" and order.lmtPrice >= price) or (order.action == "SELL" and order.lmtPrice <= price):
+                self._later(self.fill_latency, self._fill, trade, price)
+
+    def _fill(self, trade, price):
+        if trade.orderStatus.status in DONE_STATUSES:
+            return
+        order = trade.order
+        symbol = trade.contract.symbol.upper()
+        quantity = order.totalQuantity
+        execution = Execution(
+            execId=f"sim.{self._next_exec_id:08d}", time=datetime.now(timezone.utc), acctNumber=SIM_ACCOUNT,
+            side="BOT" if order.action == "BUY" else "SLD", shares=quantity, price=price,
+            permId=order.permId, clientId=order.clientId, orderId=order.orderId,
+            cumQty=quantity, avgPrice=price, orderRef=order.orderRef,
+        )
+        self._next_exec_id += 1
+        fill = Fill(trade.contract, execution, CommissionReport(execId=execution.execId), execution.time)
+        trade.fills.append(fill)
+        self.fills.append(fill)
+        trade.orderStatus.filled = quantity
+        trade.orderStatus.remaining = 0
+        trade.orderStatus.avgFillPrice = price
+        trade.orderStatus.lastFillPrice = price
+        self._set_status(trade, "Filled")
+        trade.fillEvent.emit(trade, fill)
+        trade.filledEvent.emit(trade)
+        self._book(symbol, quantity if order.action == "BUY" else -quantity, price)
+
+        # The children of a filled parent start working
+        for child in self.trades:
+            if child.order.parentId == order.orderId and child.order.clientId == order.clientId:
+                if child.orderStatus.status not in DONE_STATUSES:
+                    self._set_status(child, "PreSubmitted")
+
+    # Daily bars for the weekdays in a duration up to today: a random walk seeded by the symbol that
+    # ends at the symbol's current price, so repeated requests return the same history
+    def history(self, symbol, duration):
+        count, unit = duration.split()
+        end = pd.Timestamp.now().normalize()
+        days = pd.bdate_range(end - pd.Timedelta(days=int(count) * DURATION_DAYS[unit[0].upper()] - 1), end)
+        seed = zlib.crc32(symbol.encode())
+        # Draws run backwards from today, so a longer request extends the same history into the past
+        returns = np.random.default_rng(seed).normal(0, SIM_DAILY_VOLATILITY, len(days))
+        closes = (self.price(symbol) * np.exp(-np.concatenate([[0], np.cumsum(returns[:-1])])))[::-1]
+        returns = returns[::-1]
+        opens = closes * np.exp(-returns)
+        spread = np.abs(np.random.default_rng(seed + 1).normal(0, SIM_DAILY_VOLATILITY / 2, len(days)))[::-1]
+        highs = np.maximum(opens, closes) * (1 + spread)
+        lows = np.minimum(opens, closes) * (1 - spread)
+        volumes = np.random.default_rng(seed + 2).integers(100_000, 5_000_000, len(days))[::-1]
+        return [
+            BarData(date=day.date(), open=round(o, 2), high=round(h, 2), low=round(l, 2), close=round(c, 2), volume=float(v))
+            for day, o, h, l, c, v in zip(days, opens, highs, lows, closes, volumes)
+        ]
+
+    # Update the position for a fill and tell every connection
+    def _book(self, symbol, change, price):
+        contract, position, avg_cost = self.positions.get(symbol, [self.contract(symbol), 0, 0.0])
+        new_position = position + change
+        if new_position and (position == 0 or (position > 0) == (change > 0)):
+            avg_cost = (position * avg_cost + change * price) / new_position
+        self.positions[symbol] = [contract, new_position, avg_cost if new_position else 0.0]
+        for ib in self.connections:
+            ib.positionEvent.emit(Position(SIM_ACCOUNT, contract, new_position, avg_cost))
+            ib.updatePortfolioEvent.emit(self.portfolio_item(symbol))
+            ib.updateEvent.emit()
+
+    def portfolio_item(self, symbol):
+        contract, position, avg_cost = self.positions[symbol]
+        price = self.price(symbol)
+        return PortfolioItem(
+            contract, position, price, position * price, avg_cost,
+            position * (price - avg_cost), 0.0, SIM_ACCOUNT,
+        )
+
+    def cancel(self, order):
+        for trade in self.trades:
+            if trade.order is order or (trade.order.permId and trade.order.permId == order.permId):
+                if trade.orderStatus.status not in DONE_STATUSES:
+                    self._held.pop((trade.order.clientId, trade.order.orderId), None)
+                    trade.orderStatus.status = "PendingCancel"
+                    self._later(self.ack_latency, self._set_status, trade, "Cancelled", "Order cancelled", 202)
+                return trade
+        return None
+
+    # Stream a quote for a ticker; a snapshot gets a single update
+    def quote(self, ib, market_data):
+        symbol = market_data.contract.symbol.upper()
+        price = self.price(symbol)
+        market_data.last = price
+        market_data.close = price
+        market_data.bid = round(price - 0.01, 2)
+        market_data.ask = round(price + 0.01, 2)
+        market_data.time = datetime.now(timezone.utc)
+        market_data.updateEvent.emit(market_data)
+        ib.pendingTickersEvent.emit({market_data})
+        ib.updateEvent.emit()
+
+# Offline stand-in for ib_insync.IB covering the calls this project makes. Several connections
+# (client IDs) can share one SimBroker; everything runs on the asyncio loop, so trading paths
+# run at full speed against it with no network or TWS.
+class SimIB:
+    events = (
+        "connectedEvent", "disconnectedEvent", "updateEvent", "pendingTickersEvent",
+        "newOrderEvent", "orderModifyEvent", "cancelOrderEvent", "openOrderEvent",
+        "orderStatusEvent", "execDetailsEvent", "updatePortfolioEvent", "positionEvent", "errorEvent",
+    )
+
+    def __init__(self, broker=None, **broker_options):
+        self.broker = broker or SimBroker(**broker_options)
+        for name in self.events:
+            setattr(self, name, Event(name))
+        self.clientId = 0
+        self._connected = False
+        self._next_order_id = 1
+        self._tickers = {}
+        self.client = self
+
+    def __repr__(self):
+        return f"<SimIB clientId={self.clientId} connected={self._connected}>"
+
+    # Used as ib.client.getReqId()
+    def getReqId(self):
+        order_id = self._next_order_id
+        self._next_order_id += 1
+        return order_id
+
+    def connect(self, host="127.0.0.1", port=7497, clientId=1, timeout=4, readonly=False, account=""):
+        self.clientId = clientId
+        self._next_order_id = clientId * 1_000_000 + 1
+        self._connected = True
+        if self not in self.broker.connections:
+            self.broker.connections.append(self)
+        self.connectedEvent.emit()
+        return self
+
+    async def connectAsync(self, host="127.0.0.1", port=7497, clientId=1, timeout=4, readonly=False, account=""):
+        return self.connect(host, port, clientId, timeout, readonly, account)
+
+    def disconnect(self):
+        if self._connected:
+            self._connected = False
+            if self in self.broker.connections:
+                self.broker.connections.remove(self)
+            self.disconnectedEvent.emit()
+
+    def isConnected(self):
+        return self._connected
+
+    # Event loop helpers, same semantics as IB
+    def run(self, *awaitables, timeout=None):
+        return util.run(*awaitables, timeout=timeout)
+
+    def sleep(self, secs=0.02):
+        util.run(asyncio.sleep(secs))
+        return True
+
+    def waitOnUpdate(self, timeout=0):
+        try:
+            util.run(asyncio.wait_for(self.updateEvent, timeout or None))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    # Contracts
+    def qualifyContracts(self, *contracts):
+        qualified = []
+        for contract in contracts:
+            symbol = contract.symbol.upper()
+            if symbol in self.broker.unknown_symbols:
+                logger.warning(f"Unknown contract: {contract}")
+                continue
+            contract.conId = self.broker.conid(symbol)
+            contract.primaryExchange = contract.primaryExchange or "NASDAQ"
+            contract.localSymbol = contract.localSymbol or symbol
+            qualified.append(contract)
+        return qualified
+
+    async def qualifyContractsAsync(self, *contracts):
+        await asyncio.sleep(self.broker.ack_latency)
+        return self.qualifyContracts(*contracts)
+
+    # Market data
+    def reqMktData(self, contract, genericTickList="", snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        market_data = Ticker(contract=contract)
+        if not snapshot:
+            self._tickers[id(contract)] = market_data
+        self.broker._later(self.broker.market_data_latency, self.broker.quote, self, market_data)
+        return market_data
+
+    def cancelMktData(self, contract):
+        self._tickers.pop(id(contract), None)
+
+    def tickers(self):
+        return list(self._tickers.values())
+
+    # Historical bars (daily bars only)
+    def reqHistoricalData(self, contract, endDateTime="", durationStr="1 D", barSizeSetting="1 day",
+                          whatToShow="TRADES", useRTH=True, formatDate=1, keepUpToDate=False, chartOptions=None, timeout=60):
+        return self.broker.history(contract.symbol.upper(), durationStr)
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime="", durationStr="1 D", barSizeSetting="1 day",
+                                     whatToShow="TRADES", useRTH=True, formatDate=1, keepUpToDate=False, chartOptions=None, timeout=60):
+        await asyncio.sleep(self.broker.market_data_latency)
+        return self.reqHistoricalData(contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH, formatDate)
+
+    # Orders
+    def placeOrder(self, contract, order):
+        return self.broker.place(self, contract, order)
+
+    # Like IB, only the client that placed an order can cancel it
+    def cancelOrder(self, order):
+        if order.clientId and order.clientId != self.clientId:
+            self.errorEvent.emit(order.orderId, 10147, f"OrderId {order.orderId} that needs to be cancelled is not found.", None)
+            return None
+        trade = self.broker.cancel(order)
+        if trade:
+            self.cancelOrderEvent.emit(trade)
+        return trade
+
+    def reqGlobalCancel(self):
+        for trade in self.broker.trades:
+            if trade.orderStatus.status not in DONE_STATUSES:
+                self.broker.cancel(trade.order)
+
+    def trades(self):
+        return [trade for trade in self.broker.trades if trade.order.clientId == self.clientId]
+
+    def openTrades(self):
+        return [trade for trade in self.trades() if trade.orderStatus.status not in DONE_STATUSES]
+
+    def openOrders(self):
+        return [trade.order for trade in self.openTrades()]
+
+    # Like IB, the order requests return trades
+    def reqOpenOrders(self):
+        return self.openTrades()
+
+    async def reqOpenOrdersAsync(self):
+        return self.reqOpenOrders()
+
+    def reqAllOpenOrders(self):
+        return [trade for trade in self.broker.trades if trade.orderStatus.status not in DONE_STATUSES]
+
+    async def reqAllOpenOrdersAsync(self):
+        return self.reqAllOpenOrders()
+
+    # Executions and account
+    def fills(self):
+        return list(self.broker.fills)
+
+    def executions(self):
+        return [fill.execution for fill in self.broker.fills]
+
+    def reqExecutions(self, execFilter=None):
+        return self.fills()
+
+    async def reqExecutionsAsync(self, execFilter=None):
+        return self.fills()
+
+    def portfolio(self, account=""):
+        return [self.broker.portfolio_item(symbol) for symbol in self.broker.positions]
+
+    def positions(self, account=""):
+        return [
+            Position(SIM_ACCOUNT, contract, position, avg_cost)
+            for contract, position, avg_cost in self.broker.positions.values()
+        ]
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import pytest
+
+# utils picks the simulated gateway at import time; keep its workbook and journal out of the repo
+os.environ["IBKR_TRADING_MODE"] = "Sim"
+os.environ.setdefault("IBKR_SIM_DIR", tempfile.mkdtemp(prefix="ibkr-sim-"))
+
+import utils
+
+TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "META", "GOOG"]
+
+# Trailing limits placed by the main client (ID 1) before a pool of 3 is opened, so most tickers now
+# map to a shard whose client did not place their orders
+@pytest.fixture(scope="module")
+def pool():
+    utils.init_ibkr_connection("Sim")
+    for ticker in TICKERS:
+        utils.attach_trailing_limit(utils.ib.broker.contract(ticker), "BUY", 10, 100.0, 5.0)
+    utils.open_execution_pool(3)
+    yield utils.execution_pool
+    utils.disconnect_ibkr()
+
+def test_orders_of_other_clients_are_found(pool):
+    assert {utils.connection_for(ticker).client_id for ticker in TICKERS} != {1}
+    for ticker in TICKERS:
+        assert utils.working_trail_percent(ticker) == 5.0
+        assert [connection.client_id for connection, _ in utils.working_orders(ticker)] == [1]
+
+def test_cancel_goes_through_the_placing_client(pool):
+    for ticker in TICKERS:
+        cancelled = utils.cancel_existing_orders(ticker)
+        assert [trade.orderStatus.status for trade in cancelled] == ["Cancelled"]
+        assert utils.working_trail_percent(ticker) is None
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import pytest
+
+# utils picks the simulated gateway at import time; keep its workbook and journal out of the repo
+os.environ["IBKR_TRADING_MODE"] = "Sim"
+os.environ.setdefault("IBKR_SIM_DIR", tempfile.mkdtemp(prefix="ibkr-sim-"))
+
+from ib_insync import LimitOrder
+import utils
+from intent_log import intent_key, INTENT_SENT, INTENT_FAILED, INTENT_CLOSED
+
+@pytest.fixture(scope="module", autouse=True)
+def sim():
+    utils.init_ibkr_connection("Sim")
+    yield utils.ib
+    utils.disconnect_ibkr()
+
+def _place_at_broker(order_ref, symbol="AAPL"):
+    order = LimitOrder("BUY", 1, 1.0)
+    order.orderRef = order_ref
+    utils.ib.placeOrder(utils.ib.broker.contract(symbol), order)
+    utils.ib.sleep(0.05)
+
+def test_broker_order_refs_reads_open_trades():
+    _place_at_broker("it-test-open.1")
+    assert "it-test-open.1" in utils.broker_order_refs()
+
+def test_new_work_gets_first_attempt():
+    key = intent_key("new work")
+    refs, recovered = utils.resolve_intents([key])
+    assert refs[key] == f"{key}.1" and not recovered
+
+def test_sent_intent_is_recovered_until_closed():
+    key = intent_key("sent work")
+    intents = utils.get_intent_log()
+    intents.begin(f"{key}.1", "test", "AAPL", "BUY", "LMT")
+    intents.finish(f"{key}.1", INTENT_SENT)
+    refs, recovered = utils.resolve_intents([key])
+    assert key in recovered and refs[key] == f"{key}.1"
+
+    utils.close_intents([f"{key}.1"])
+    refs, recovered = utils.resolve_intents([key])
+    assert not recovered and refs[key] == f"{key}.2"
+    assert intents.states([f"{key}.1"]) == {f"{key}.1": INTENT_CLOSED}
+
+def test_failed_intent_found_at_broker_is_recovered():
+    key = intent_key("late ack")
+    intents = utils.get_intent_log()
+    intents.begin(f"{key}.1", "test", "AAPL", "BUY", "LMT")
+    intents.finish(f"{key}.1", INTENT_FAILED)
+    _place_at_broker(f"{key}.1")
+    refs, recovered = utils.resolve_intents([key])
+    assert key in recovered
+    assert intents.states([f"{key}.1"]) == {f"{key}.1": INTENT_SENT}
+
+def test_pending_intent_missing_at_broker_is_retried():
+    key = intent_key("crashed before submission")
+    intents = utils.get_intent_log()
+    intents.begin(f"{key}.1", "test", "AAPL", "BUY", "LMT")
+    refs, recovered = utils.resolve_intents([key])
+    assert not recovered and refs[key] == f"{key}.2"
+    assert intents.states([f"{key}.1"]) == {f"{key}.1": INTENT_FAILED}
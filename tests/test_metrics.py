@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+import metrics
+from metrics import instrument
+
+@instrument("test.page")
+def _update_page(trading_mode):
+    return trading_mode
+
+@instrument("test.handler", ticker="ticker")
+async def _handle(index, ticker, quantity):
+    return ticker
+
+@instrument("test.ack", ticker="trade")
+def _wait(trade, timeout=5):
+    return trade
+
+# Run a coroutine on a private loop, leaving the current event loop (used by the ib_insync tests) alone
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+def _last_ticker(stage):
+    return [ticker for span_stage, ticker, *_ in metrics._spans if span_stage == stage][-1]
+
+def test_spans_without_a_ticker_argument_carry_no_ticker():
+    _update_page("Live")
+    assert _last_ticker("test.page") is None
+
+def test_spans_take_the_named_ticker_argument():
+    _run(_handle(3, "AAPL", 10))
+    assert _last_ticker("test.handler") == "AAPL"
+    _run(_handle(3, quantity=10, ticker="MSFT"))
+    assert _last_ticker("test.handler") == "MSFT"
+    _wait(SimpleNamespace(contract=SimpleNamespace(symbol="NVDA")))
+    assert _last_ticker("test.ack") == "NVDA"
+
+def test_summary_is_per_run_and_prometheus_counts_accumulate():
+    metrics.record("test.run", 0.002)
+    metrics.reset_run()
+    metrics.record("test.run", 0.2)
+    metrics.record("test.run", 0.3, ok=False)
+    assert metrics.summary()["test.run"]["count"] == 2
+    assert metrics.summary()["test.run"]["p50"] >= 0.2
+    text = metrics.prometheus_text()
+    assert 'ibkr_stage_latency_seconds_count{stage="test.run"} 3' in text
+    assert 'ibkr_stage_latency_seconds_bucket{stage="test.run",le="0.0025"} 1' in text
+    assert 'ibkr_stage_errors_total{stage="test.run"} 1' in text
+    metrics.reset_run()
+    assert "test.run" not in metrics.summary()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import pandas as pd
+import pytest
+
+# utils picks the simulated gateway at import time; keep its workbook and journal out of the repo
+os.environ["IBKR_TRADING_MODE"] = "Sim"
+os.environ.setdefault("IBKR_SIM_DIR", tempfile.mkdtemp(prefix="ibkr-sim-"))
+
+import utils
+
+ADC_ROW = {"Ticker": "ADC", "Amount": 1234.0, "Quantity": 14.0, "TrailLimit%": 3.0,
+           "OrderType": "MKT-ATCH-LIMIT", "Status": "Open", "Execution": " "}
+
+@pytest.fixture(scope="module", autouse=True)
+def sim():
+    utils.init_ibkr_connection("Sim")
+    broker = utils.ib.broker
+    for symbol, quantity in (("ADC", 14), ("MSFT", 5)):
+        broker.positions[symbol] = [broker.contract(symbol), quantity, 100.0]
+    utils.ib.sleep(0.05)
+    yield utils.ib
+    utils.disconnect_ibkr()
+
+# ADC holding that cannot be priced, with its row already on the BUY sheet
+@pytest.fixture
+def unpriced_adc(monkeypatch):
+    get_market_prices = utils.get_market_prices
+    monkeypatch.setattr(utils, "get_market_prices", lambda tickers, *args, **kwargs: {
+        symbol: price for symbol, price in get_market_prices([t for t in tickers if t != "ADC"]).items()
+    })
+    utils.update_sheet_in_excel("BUY_Usual", pd.DataFrame([ADC_ROW]))
+
+def _buy_rows():
+    return pd.read_excel(utils.get_excel_file(), sheet_name="BUY_Usual").set_index("Ticker")
+
+@pytest.mark.parametrize("mode", ["Live", "Paper"])
+def test_unpriced_holding_keeps_its_row(unpriced_adc, mode):
+    utils.update_orders_page(mode)
+    rows = _buy_rows()
+    assert "MSFT" in rows.index
+    adc = rows.loc["ADC"]
+    assert (adc["Amount"], adc["Quantity"], adc["TrailLimit%"], adc["Status"]) == (1234, 14, 3.0, "Open")
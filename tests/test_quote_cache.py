@@ -0,0 +1,32 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+import pytest
+
+# utils picks the simulated gateway at import time; keep its workbook and journal out of the repo
+os.environ["IBKR_TRADING_MODE"] = "Sim"
+os.environ.setdefault("IBKR_SIM_DIR", tempfile.mkdtemp(prefix="ibkr-sim-"))
+
+import utils
+
+@pytest.fixture(scope="module")
+def sim():
+    utils.init_ibkr_connection("Sim")
+    yield utils.ib
+    utils.disconnect_ibkr()
+
+def test_stale_quote_is_requested_again(sim):
+    sim.broker.prices["AAPL"] = 100.0
+    assert utils.get_market_prices(["AAPL"]) == {"AAPL": 100.0}
+
+    # The line stops updating for 3 hours while the price moves
+    utils.quote_cache._tickers["AAPL"].time = datetime.now(timezone.utc) - timedelta(hours=3)
+    sim.broker.prices["AAPL"] = 150.0
+    assert utils.get_market_prices(["AAPL"]) == {"AAPL": 150.0}
+
+def test_disconnect_drops_subscriptions(sim):
+    utils.get_market_prices(["MSFT"])
+    assert "MSFT" in utils.quote_cache
+    sim.disconnect()
+    assert "MSFT" not in utils.quote_cache
+    utils.init_ibkr_connection("Sim")
@@ -0,0 +1,53 @@
+import inspect
+import typing
+import pytest
+from ib_insync import IB, MarketOrder, LimitOrder
+from sim_ib import SimIB
+
+# Element type of a List[...] (or Awaitable[List[...]]) return annotation, or None
+def _list_element_type(method):
+    try:
+        annotation = typing.get_type_hints(method).get("return")
+    except Exception:
+        return None
+    if typing.get_origin(annotation) is typing.get_origin(typing.Awaitable[int]):
+        annotation = typing.get_args(annotation)[0]
+    if typing.get_origin(annotation) is list:
+        element = typing.get_args(annotation)[0]
+        return element if inspect.isclass(element) else None
+    return None
+
+# SimIB methods also on IB that return lists and need no arguments
+def _list_methods():
+    names = []
+    for name, method in inspect.getmembers(SimIB, inspect.isfunction):
+        if name.startswith("_") or not hasattr(IB, name) or _list_element_type(getattr(IB, name)) is None:
+            continue
+        parameters = list(inspect.signature(method).parameters.values())[1:]
+        if all(parameter.default is not inspect.Parameter.empty for parameter in parameters):
+            names.append(name)
+    return names
+
+@pytest.fixture
+def sim():
+    ib = SimIB(positions={"AAPL": 10})
+    ib.connect(clientId=1)
+    contract = ib.broker.contract("AAPL")
+    ib.placeOrder(contract, MarketOrder("BUY", 5))
+    ib.placeOrder(contract, LimitOrder("SELL", 5, 1000.0))
+    ib.reqMktData(contract)
+    ib.sleep(0.05)
+    yield ib
+    ib.disconnect()
+
+def test_list_methods_are_covered():
+    assert {"reqOpenOrders", "reqAllOpenOrders", "reqAllOpenOrdersAsync", "openOrders", "trades", "fills"} <= set(_list_methods())
+
+@pytest.mark.parametrize("name", _list_methods())
+def test_list_methods_return_ib_types(sim, name):
+    result = getattr(sim, name)()
+    if inspect.isawaitable(result):
+        result = sim.run(result)
+    assert result, f"{name} returned nothing to check"
+    expected = _list_element_type(getattr(IB, name))
+    assert all(isinstance(item, expected) for item in result), f"{name} should return {expected.__name__} items"
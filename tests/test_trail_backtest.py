@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trail_backtest import backtest_panel, TRAIL_LIMIT_OFFSET
+
+# Bar-by-bar replay of one TRAIL LIMIT exit on raw prices, written out per side
+def reference_exit(bars, entry, percent, action, offset=TRAIL_LIMIT_OFFSET):
+    o, h, l, c = (bars[field].to_numpy() for field in ("open", "high", "low", "close"))
+    price = c[entry]
+    if action == "BUY":
+        water, stop = price, round(price * (1 - percent / 100), 2)
+    else:
+        water, stop = price, round(price * (1 + percent / 100), 2)
+    limit = None
+    for t in range(entry + 1, len(c)):
+        if action == "BUY":
+            if limit is None and l[t] <= stop:
+                limit = stop - offset
+                trigger = min(o[t], stop)
+                if trigger >= limit:
+                    return trigger, t
+                if h[t] >= limit:
+                    return limit, t
+            elif limit is not None:
+                if o[t] >= limit:
+                    return o[t], t
+                if h[t] >= limit:
+                    return limit, t
+            if limit is None:
+                water = max(water, h[t])
+                stop = max(stop, round(water * (1 - percent / 100), 2))
+        else:
+            if limit is None and h[t] >= stop:
+                limit = stop + offset
+                trigger = max(o[t], stop)
+                if trigger <= limit:
+                    return trigger, t
+                if l[t] <= limit:
+                    return limit, t
+            elif limit is not None:
+                if o[t] <= limit:
+                    return o[t], t
+                if l[t] <= limit:
+                    return limit, t
+            if limit is None:
+                water = min(water, l[t])
+                stop = min(stop, round(water * (1 + percent / 100), 2))
+    return c[-1], len(c) - 1
+
+def _random_panel(symbols=8, bars=300, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-01", periods=bars)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, symbols)), axis=0))
+    opens = closes * np.exp(rng.normal(0, 0.01, (bars, symbols)))
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0, 0.02, (bars, symbols)))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0, 0.02, (bars, symbols)))
+    columns = [f"S{i}" for i in range(symbols)]
+    return {field: pd.DataFrame(values.round(2), index=dates, columns=columns)
+            for field, values in (("open", opens), ("high", highs), ("low", lows), ("close", closes))}
+
+# One symbol whose bars open and close at the given prices, spread above and below them
+def _series_panel(prices, spread=0.0):
+    frame = pd.DataFrame({"X": prices}, index=pd.bdate_range("2024-01-01", periods=len(prices)), dtype=float)
+    return {"open": frame, "high": frame + spread, "low": frame - spread, "close": frame}
+
+@pytest.mark.parametrize("action", ["BUY", "SELL"])
+def test_matches_reference_replay(action):
+    panel = _random_panel()
+    runs = backtest_panel(panel, percents=(1.0, 3.0, 8.0), action=action)
+    assert runs["Exited"].any()
+    for _, run in runs.iterrows():
+        bars = pd.DataFrame({field: panel[field][run["Symbol"]] for field in panel})
+        entry = bars.index.get_loc(run["EntryDate"])
+        price, index = reference_exit(bars, entry, run["TrailLimit%"], action)
+        assert run["ExitPrice"] == pytest.approx(price)
+        assert run["ExitDate"] == bars.index[index]
+
+def test_flat_prices_never_trigger():
+    for action in ("BUY", "SELL"):
+        runs = backtest_panel(_series_panel([50.0] * 20), percents=(2.0,), action=action)
+        assert not runs["Exited"].any()
+        assert (runs["Return%"] == 0).all()
+
+def test_rising_prices_stop_out_sell_but_not_buy():
+    prices = list(np.linspace(100, 130, 30))
+    assert not backtest_panel(_series_panel(prices, spread=0.5), percents=(2.0,), action="BUY")["Exited"].any()
+    sells = backtest_panel(_series_panel(prices, spread=0.5), percents=(2.0,), action="SELL")
+    assert sells["Exited"].all()
+    assert (sells["Return%"] < 0).all()
+    assert (sells["ExitPrice"] > sells["EntryPrice"]).all()
@@ -0,0 +1,212 @@
+import os
+import csv
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columns (CSV) or keys (JSONL) of a bulk trade record; amount or quantity sizes the order
+TRADE_FIELDS = ("symbol", "side", "order_type", "amount", "quantity", "trail_percent")
+REQUIRED_TRADE_FIELDS = ("symbol", "side", "order_type")
+
+TRADE_SIDES = ("BUY", "SELL")
+TRADE_ORDER_TYPES = ("MKT", "MKT-ATCH-LIMIT", "LMT-ATTCH-TRAIL-LIMIT")
+DEFAULT_TRADE_TRAIL_PERCENT = 4.0
+
+# Records handled between checkpoints; two chunks of quotes must fit in the streaming line limit
+BULK_CHUNK_SIZE = 40
+
+class TradeFileError(Exception):
+    pass
+
+# One validated bulk trade record
+class TradeRecord:
+    __slots__ = ("line", "symbol", "action", "order_type", "amount", "quantity", "trail_percent")
+
+    def __init__(self, line, symbol, action, order_type, amount, quantity, trail_percent):
+        self.line = line
+        self.symbol = symbol
+        self.action = action
+        self.order_type = order_type
+        self.amount = amount
+        self.quantity = quantity
+        self.trail_percent = trail_percent
+
+    def __repr__(self):
+        return f"TradeRecord(line {self.line}: {self.order_type} {self.action} {self.symbol})"
+
+def _number(value):
+    if value is None or str(value).strip() == "":
+        return None
+    return float(value)
+
+# Validate one raw record ({field: value}); returns a TradeRecord or raises ValueError with the reason
+def parse_trade_record(line, raw):
+    unknown = set(raw) - set(TRADE_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(sorted(map(str, unknown)))}")
+    symbol = str(raw.get("symbol") or "").strip().upper()
+    action = str(raw.get("side") or "").strip().upper()
+    order_type = str(raw.get("order_type") or "").strip().upper()
+    if not symbol:
+        raise ValueError("missing symbol")
+    if action not in TRADE_SIDES:
+        raise ValueError(f"side must be one of {', '.join(TRADE_SIDES)}")
+    if order_type not in TRADE_ORDER_TYPES:
+        raise ValueError(f"order_type must be one of {', '.join(TRADE_ORDER_TYPES)}")
+    amount = _number(raw.get("amount"))
+    quantity = _number(raw.get("quantity"))
+    trail_percent = _number(raw.get("trail_percent"))
+    if quantity is not None and (quantity <= 0 or quantity % 1):
+        raise ValueError("quantity must be a positive whole number")
+    if amount is not None and amount <= 0:
+        raise ValueError("amount must be positive")
+    if quantity is None and amount is None:
+        raise ValueError("needs an amount or a quantity")
+    if trail_percent is None:
+        trail_percent = DEFAULT_TRADE_TRAIL_PERCENT
+    elif trail_percent <= 0:
+        raise ValueError("trail_percent must be positive")
+    return TradeRecord(line, symbol, action, order_type, amount, None if quantity is None else int(quantity), trail_percent)
+
+# Stream (line number, raw line, raw record) from a .csv or .jsonl trade file without reading it whole.
+# The CSV header is checked before any record is returned.
+def iter_raw_records(path):
+    with open(path, "r", newline="") as file:
+        if path.lower().endswith(".csv"):
+            header = next(csv.reader([file.readline()]), [])
+            header = [column.strip().lower() for column in header]
+            missing = [field for field in REQUIRED_TRADE_FIELDS if field not in header]
+            if missing:
+                raise TradeFileError(f"{path}: header is missing {', '.join(missing)}")
+            unknown = [column for column in header if column not in TRADE_FIELDS]
+            if unknown:
+                raise TradeFileError(f"{path}: header has unknown columns {', '.join(unknown)}")
+            for line, text in enumerate(file, start=2):
+                if text.strip():
+                    values = next(csv.reader([text]))
+                    yield line, text, dict(zip(header, values))
+        elif path.lower().endswith(".jsonl"):
+            for line, text in enumerate(file, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    raw = json.loads(text)
+                except ValueError as e:
+                    raw = e
+                yield line, text, raw
+        else:
+            raise TradeFileError(f"{path}: bulk trade files must be .csv or .jsonl")
+
+# Stream validated records, skipping invalid ones (logged and collected when an errors list is given)
+def iter_trade_records(path, errors=None):
+    for line, text, raw in iter_raw_records(path):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError(f"not a JSON object ({raw})")
+            yield parse_trade_record(line, raw), text
+        except (TypeError, ValueError) as e:
+            if errors is not None:
+                logger.error(f"{path}:{line}: {e}")
+                errors.append((line, str(e)))
+
+# Check the whole file against the schema before anything is traded; returns (valid count, errors)
+def validate_trade_file(path):
+    errors = []
+    count = sum(1 for _ in iter_trade_records(path, errors))
+    return count, errors
+
+# Progress through a bulk trade file, saved next to it as records finish. Everything up to line is
+# done, plus the listed lines of the chunk in flight. The processed prefix of the file is fingerprinted
+# so a checkpoint is only trusted while that prefix is unchanged.
+class TradeFileCheckpoint:
+    def __init__(self, path):
+        self.path = f"{path}.checkpoint.json"
+        self.line = 0
+        self.digest = hashlib.sha1().hexdigest()
+        self.done = set()
+        self.placed = 0
+        self.failed = 0
+        try:
+            with open(self.path, "r") as file:
+                state = json.load(file)
+            self.line = state["line"]
+            self.digest = state["digest"]
+            self.done = set(state.get("done", []))
+            self.placed = state.get("placed", 0)
+            self.failed = state.get("failed", 0)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+
+    def _write(self):
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w") as file:
+            json.dump({
+                "line": self.line, "digest": self.digest, "done": sorted(self.done),
+                "placed": self.placed, "failed": self.failed,
+            }, file, indent=2)
+        os.replace(temp_file, self.path)
+
+    # Record one finished record of the chunk in flight
+    def record_done(self, line, placed):
+        self.done.add(line)
+        if placed:
+            self.placed += 1
+        else:
+            self.failed += 1
+        self._write()
+
+    # Record that a whole chunk, ending at line, is finished
+    def chunk_done(self, line, digest):
+        self.line, self.digest = line, digest
+        self.done = {done for done in self.done if done > line}
+        self._write()
+
+    def reset(self):
+        self.line, self.digest, self.done, self.placed, self.failed = 0, hashlib.sha1().hexdigest(), set(), 0, 0
+
+# Stream chunks of validated records still to do, as (records, last line, prefix digest) after each chunk.
+# Lines up to the checkpoint, and records already done in the chunk in flight, are skipped when the file
+# still starts with the same content.
+def iter_pending_chunks(path, checkpoint, chunk_size=BULK_CHUNK_SIZE):
+    prefix = hashlib.sha1()
+    resume_line = checkpoint.line
+    if resume_line:
+        with open(path, "r", newline="") as file:
+            for line, text in enumerate(file, start=1):
+                if line > resume_line:
+                    break
+                prefix.update(text.encode())
+        if prefix.hexdigest() != checkpoint.digest:
+            logger.warning(f"{path} changed before the checkpoint at line {resume_line}, starting over")
+            prefix, resume_line = hashlib.sha1(), 0
+            checkpoint.reset()
+        else:
+            logger.info(f"Resuming {path} after line {resume_line}")
+
+    chunk = []
+    last_line = resume_line
+    with open(path, "r", newline="") as file:
+        lines = enumerate(file, start=1)
+        for record, text in iter_trade_records(path):
+            if record.line <= resume_line or record.line in checkpoint.done:
+                continue
+            # Fold every physical line up to this record into the prefix digest
+            for line, raw_text in lines:
+                if line > resume_line:
+                    prefix.update(raw_text.encode())
+                if line == record.line:
+                    break
+            chunk.append(record)
+            last_line = record.line
+            if len(chunk) >= chunk_size:
+                yield chunk, last_line, prefix.hexdigest()
+                chunk = []
+        for line, raw_text in lines:
+            if line > resume_line:
+                prefix.update(raw_text.encode())
+            last_line = line
+    yield chunk, last_line, prefix.hexdigest()
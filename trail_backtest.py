@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from bar_store import BarStore, BAR_STORE_DIR, BAR_SIZE
+
+logger = logging.getLogger(__name__)
+
+# lmtPriceOffset of the TRAIL LIMIT orders placed by utils._trailing_limit_order
+TRAIL_LIMIT_OFFSET = 0.10
+
+# TrailLimit% values tried by the grid search
+DEFAULT_TRAIL_GRID = (1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 10.0)
+
+# A position is opened every this many bars per symbol, so each percent is scored over many entries
+ENTRY_EVERY = 5
+
+# Symbols per process-pool task
+SYMBOLS_PER_TASK = 25
+
+# Trailing stop placed at entry, as in utils._trailing_limit_order
+def initial_trail_stop(action, price, trail_limit_percent):
+    if action == "BUY":
+        return np.round(price * (1 - trail_limit_percent / 100), 2)
+    return np.round(price * (1 + trail_limit_percent / 100), 2)
+
+# Replay TRAIL LIMIT exits for many runs at once. Prices are (bars x symbols) arrays; each run is a
+# symbol column, an entry bar and a trailing percent, and action is the side of the entry. A BUY run
+# enters at the close of its entry bar with a SELL stop at entry * (1 - pct) that ratchets up behind the
+# highest high; a bar whose low reaches the stop of the bars before it triggers a limit at stop - offset,
+# filled at the stop (or at the open when it gaps below the stop) if that is at or above the limit,
+# otherwise at the limit once a high reaches it. A SELL run mirrors this: a BUY stop at entry * (1 + pct)
+# ratchets down behind the lowest low, a high at or above it triggers a limit at stop + offset, filled at
+# the stop (or a higher open) if that is at or below the limit, otherwise once a low reaches the limit.
+# Runs still open at the end are marked to the last close.
+def simulate_trailing_limit(opens, highs, lows, closes, columns, entries, percents, action="BUY", offset=TRAIL_LIMIT_OFFSET):
+    runs = len(columns)
+    if action == "BUY":
+        # favorable: the extreme the stop trails; adverse: the extreme that triggers it; better: an exit
+        # price at or better than a level; worst: the worse of two exit prices
+        favorable, adverse, better, best, worst = highs, lows, np.greater_equal, np.maximum, np.minimum
+        factor, limit_offset = 1 - percents / 100, -offset
+    else:
+        favorable, adverse, better, best, worst = lows, highs, np.less_equal, np.minimum, np.maximum
+        factor, limit_offset = 1 + percents / 100, offset
+    entry_price = closes[entries, columns]
+    water_mark = entry_price.copy()
+    stop = initial_trail_stop(action, entry_price, percents)
+    limit = np.full(runs, np.nan)
+    triggered = np.zeros(runs, dtype=bool)
+    exit_price = np.full(runs, np.nan)
+    exit_index = np.full(runs, -1)
+
+    # Only runs between their entry and their exit are stepped: most exit within a few bars, so each
+    # bar touches a small live set instead of every run
+    by_entry = np.argsort(entries, kind="stable")
+    sorted_entries = entries[by_entry]
+    live = np.empty(0, dtype=int)
+    for t in range(int(sorted_entries[0]) + 1, len(closes)):
+        opened = by_entry[np.searchsorted(sorted_entries, t - 1, "left"):np.searchsorted(sorted_entries, t - 1, "right")]
+        live = np.concatenate([live, opened])
+        if not len(live):
+            continue
+        cols = columns[live]
+        o, f, a = opens[t, cols], favorable[t, cols], adverse[t, cols]
+        has_bar = ~np.isnan(a)
+        run_stop, run_limit, run_triggered = stop[live], limit[live], triggered[live]
+        with np.errstate(invalid="ignore"):
+            # A limit triggered on an earlier bar fills at the open or when the bar reaches it
+            resting_fill = np.where(better(o, run_limit), o, np.where(better(f, run_limit), run_limit, np.nan))
+            # New triggers against the stop carried over from the bars before
+            new = has_bar & ~run_triggered & better(run_stop, a)
+            new_limit = run_stop + limit_offset
+            trigger_price = worst(o, run_stop)
+            new_fill = np.where(better(trigger_price, new_limit), trigger_price, np.where(better(f, new_limit), new_limit, np.nan))
+        price = np.where(run_triggered, resting_fill, np.where(new, new_fill, np.nan))
+        limit[live] = np.where(new, new_limit, run_limit)
+        triggered[live] = run_triggered | new
+        filled = ~np.isnan(price)
+        exit_price[live[filled]] = price[filled]
+        exit_index[live[filled]] = t
+        # Untriggered runs trail the stop behind this bar's favorable extreme for the next bar
+        trailing = has_bar & ~triggered[live]
+        trail_runs = live[trailing]
+        water_mark[trail_runs] = best(water_mark[trail_runs], f[trailing])
+        stop[trail_runs] = best(stop[trail_runs], np.round(water_mark[trail_runs] * factor[trail_runs], 2))
+        live = live[~filled]
+
+    exited = exit_index >= 0
+    last_close = pd.DataFrame(closes).ffill().to_numpy()[-1, columns]
+    return {
+        "entry_price": entry_price,
+        "exit_price": np.where(exited, exit_price, last_close),
+        "exit_index": np.where(exited, exit_index, len(closes) - 1),
+        "exited": exited,
+        "triggered": triggered,
+    }
+
+# Per-run results of a grid over percents for every symbol of a price panel ({field: dates x symbols})
+def backtest_panel(panel, percents=DEFAULT_TRAIL_GRID, action="BUY", entry_every=ENTRY_EVERY, offset=TRAIL_LIMIT_OFFSET):
+    closes_frame = panel["close"]
+    symbols = closes_frame.columns
+    opens, highs, lows, closes = (panel[field].reindex_like(closes_frame).to_numpy(dtype=float) for field in ("open", "high", "low", "close"))
+
+    # Entry bars: every entry_every-th bar of each symbol that has a close and at least one bar after it
+    valid = ~np.isnan(closes)
+    valid[-1] = False
+    bar_index, column = np.nonzero(valid[::entry_every])
+    bar_index *= entry_every
+    grid = np.asarray(percents, dtype=float)
+    entries = np.repeat(bar_index, len(grid))
+    columns = np.repeat(column, len(grid))
+    runs_percent = np.tile(grid, len(bar_index))
+    if not len(entries):
+        return pd.DataFrame()
+
+    result = simulate_trailing_limit(opens, highs, lows, closes, columns, entries, runs_percent, action, offset)
+    sign = 1 if action == "BUY" else -1
+    dates = closes_frame.index
+    return pd.DataFrame({
+        "Symbol": symbols[columns],
+        "TrailLimit%": runs_percent,
+        "Action": action,
+        "EntryDate": dates[entries],
+        "EntryPrice": result["entry_price"],
+        "ExitDate": dates[result["exit_index"]],
+        "ExitPrice": result["exit_price"],
+        "Bars": result["exit_index"] - entries,
+        "Exited": result["exited"],
+        "Unfilled": result["triggered"] & ~result["exited"],
+        "Return%": 100 * sign * (result["exit_price"] / result["entry_price"] - 1),
+    })
+
+# One process-pool task: read a chunk of symbols from the bar store and backtest them
+def _backtest_task(root, bar_size, symbols, start, end, percents, action, entry_every):
+    store = BarStore(root, bar_size)
+    panel = {field: store.panel(symbols, start, end, field) for field in ("open", "high", "low", "close")}
+    if panel["close"].empty:
+        return pd.DataFrame()
+    return backtest_panel(panel, percents, action, entry_every)
+
+# Score each symbol and percent over its runs
+def summarize_runs(runs):
+    grouped = runs.assign(Won=runs["Return%"] > 0).groupby(["Symbol", "TrailLimit%"])
+    summary = grouped.agg(
+        Runs=("Return%", "size"),
+        MeanReturn=("Return%", "mean"),
+        MedianReturn=("Return%", "median"),
+        WinRate=("Won", "mean"),
+        MeanBars=("Bars", "mean"),
+        ExitRate=("Exited", "mean"),
+        Unfilled=("Unfilled", "sum"),
+    )
+    return summary.reset_index()
+
+# Percent with the best mean return per symbol
+def best_trail_percent(summary):
+    best = summary.loc[summary.groupby("Symbol")["MeanReturn"].idxmax()]
+    return best.set_index("Symbol")["TrailLimit%"]
+
+# Grid search of TrailLimit% over symbols from the bar store, spread across a process pool.
+# Returns (runs, summary).
+def grid_search(symbols, percents=DEFAULT_TRAIL_GRID, start=None, end=None, action="BUY",
+                store=None, entry_every=ENTRY_EVERY, workers=None):
+    store = store or BarStore()
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols))
+    chunks = [symbols[i:i + SYMBOLS_PER_TASK] for i in range(0, len(symbols), SYMBOLS_PER_TASK)]
+    args = [(store.root, store.bar_size, chunk, start, end, tuple(percents), action, entry_every) for chunk in chunks]
+
+    started = time.monotonic()
+    if len(chunks) <= 1 or workers == 1:
+        frames = [_backtest_task(*task) for task in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(_backtest_task, *zip(*args)))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        logger.warning("No bars in the bar store for the requested symbols")
+        return pd.DataFrame(), pd.DataFrame()
+
+    runs = pd.concat(frames, ignore_index=True)
+    summary = summarize_runs(runs)
+    logger.info(f"🧪 Backtested {len(runs)} trailing-limit runs ({runs['Symbol'].nunique()} symbols x {len(percents)} percents) "
+                f"in {time.monotonic() - started:.2f}s")
+    return runs, summary
+
+# python trail_backtest.py [SYMBOL ...] - grid search over the given symbols (default: the whole bar store)
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = BarStore(BAR_STORE_DIR, BAR_SIZE)
+    runs, summary = grid_search(sys.argv[1:] or store.symbols(), store=store)
+    if not summary.empty:
+        report_file = os.path.join(store.root, f"trail_backtest-{datetime.today().strftime('%Y-%m-%d')}.csv")
+        summary.to_csv(report_file, index=False)
+        print(best_trail_percent(summary).value_counts().sort_index().rename("Symbols").to_string())
+        print(f"✅ Report written to {report_file}")
@@ -2,9 +2,27 @@ import logging
 CANCEL_ALL_FIRST = True
 import pandas as pd
 import math
+import time
+import os
+import json
+import shutil
+import asyncio
+import contextvars
+from functools import partial
 from ib_insync import *
-import yfinance as yf
 from datetime import datetime
+from engine import RateLimiter, run_ordered_by_key, run_prioritized, PRIORITY_CANCEL, PRIORITY_PROTECT
+from order_index import OrderIndex, normalize_symbol
+from position_cache import PositionCache, POSITION_SETTLE_TIMEOUT
+from workbook import WorkbookSession, WorkbookChangedError
+from journal import TradeJournal, JOURNAL_FILE
+from yahoo_cache import DailyBarCache, MARKET_TZ
+from quote_cache import QuoteCache, QUOTE_MAX_AGE
+from sim_ib import SimIB
+from metrics import instrument, timed
+from intent_log import IntentLog, intent_key, intent_ref, INTENT_PENDING, INTENT_SENT, INTENT_FAILED
+from connection_pool import PoolConnection, ExecutionPool
+from bar_store import BarStore, bars_frame, HISTORICAL_MAX_CONCURRENT
 
 
 # Suppress ib_insync internal logs
@@ -14,14 +32,76 @@ logging.getLogger('ib_insync').setLevel(logging.WARNING)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize IB connection with dynamic mode
-ib = IB()
+# Initialize IB connection with dynamic mode; IBKR_TRADING_MODE=Sim uses the offline simulated gateway
+ib = SimIB() if os.getenv("IBKR_TRADING_MODE") == "Sim" else IB()
 excel_file = None
 
+# Workbook and local state used in Sim mode, so simulated runs never touch the real files
+SIM_DATA_DIR = os.getenv("IBKR_SIM_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "PaperTrading", "sim"))
+SIM_EXCEL_FILE = os.getenv("IBKR_EXCEL_FILE", os.path.join(SIM_DATA_DIR, "Orders_Sim.xlsx"))
+SIM_SEED_WORKBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PaperTrading", "Orders_PaperTrading.xlsx")
+
+# Open unit-of-work over excel_file for the current run, if any
+workbook_session = None
+
+# Append-only trade journal, opened on first use
+journal_file = JOURNAL_FILE
+_journal = None
+_intent_log = None
+
+# Sent intents whose outcome is staged in the open workbook session; closed once it is saved
+_unsaved_intents = set()
+
+# orderRef stamped on every order placed by the intent being executed in the current task
+current_order_ref = contextvars.ContextVar("current_order_ref", default=None)
+
+# Daily closes from Yahoo Finance, used when IBKR has no price
+yahoo_bars = DailyBarCache()
+
+# Local daily-bar history per symbol, filled from reqHistoricalData by fill_bar_store
+bar_store = BarStore()
+
+# Working orders by symbol and order type, maintained from IB's order events
+order_index = OrderIndex(ib)
+
+# Paces every order, cancel and market-data message sent to IB
+ib_pacer = RateLimiter()
+
+# Positions by symbol and secType, maintained from IB's portfolio and position events
+position_cache = PositionCache(ib)
+
+# Streaming quotes for the active working set, read from memory by every price lookup
+quote_cache = QuoteCache(ib, ib_pacer)
+
+# Extra API connections (distinct client IDs) that orders are sharded across by ticker; 1 keeps
+# everything on the main connection
+EXECUTION_POOL_SIZE = int(os.getenv("IBKR_POOL_SIZE", "1"))
+main_connection = PoolConnection(ib, ib_pacer, order_index)
+execution_pool = None
+
+# Qualified contracts are cached on disk per symbol so restarts skip contract-details round trips
+CONTRACT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "contract_cache.json")
+CONTRACT_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+_contract_cache = None
+
 # Function to set real or paper trading connection
 def init_ibkr_connection(Trading_Mode):
-    global ib, excel_file
-    if Trading_Mode == "Paper":
+    global ib, excel_file, journal_file, CONTRACT_CACHE_FILE, bar_store
+    if Trading_Mode == "Sim":
+        if not isinstance(ib, SimIB):
+            logger.error("Sim mode needs IBKR_TRADING_MODE=Sim set before utils is imported")
+            return
+        os.makedirs(SIM_DATA_DIR, exist_ok=True)
+        ib.connect("127.0.0.1", 7497, clientId=1)
+        excel_file = SIM_EXCEL_FILE
+        if not os.path.exists(excel_file):
+            shutil.copyfile(SIM_SEED_WORKBOOK, excel_file)
+            logger.info(f"Seeded simulated workbook {excel_file} from {SIM_SEED_WORKBOOK}")
+        journal_file = os.path.join(SIM_DATA_DIR, "trade_journal.db")
+        CONTRACT_CACHE_FILE = os.path.join(SIM_DATA_DIR, "contract_cache.json")
+        yahoo_bars.path = os.path.join(SIM_DATA_DIR, "yahoo_daily_bars.json")
+        bar_store = BarStore(os.path.join(SIM_DATA_DIR, "bar_store"))
+    elif Trading_Mode == "Paper":
         ib.connect("127.0.0.1", 7497, clientId=1)
         excel_file = "c:/Users/jyoti/Downloads/Stocks/IBKR_TRADER/PaperTrading/Orders_PaperTrading.xlsx"
     elif Trading_Mode == "Live":
@@ -29,6 +109,73 @@ def init_ibkr_connection(Trading_Mode):
         excel_file = "c:/Users/jyoti/Downloads/Stocks/IBKR_TRADER/Orders.xlsx"
     else:
         logger.error("Improper Trading Mode")
+        return
+    if EXECUTION_POOL_SIZE > 1 and ib.isConnected():
+        open_execution_pool(EXECUTION_POOL_SIZE)
+
+# Connect size - 1 more clients next to the main one and shard order traffic across all of them
+def open_execution_pool(size=EXECUTION_POOL_SIZE, host="127.0.0.1", port=7497):
+    global execution_pool
+    if execution_pool is not None:
+        for connection in execution_pool.connections.values():
+            if connection is not main_connection:
+                connection.ib.disconnect()
+    connections = [main_connection]
+    for client_id in range(main_connection.client_id + 1, main_connection.client_id + size):
+        worker = SimIB(broker=ib.broker) if isinstance(ib, SimIB) else IB()
+        try:
+            worker.connect(host, port, clientId=client_id)
+            connections.append(PoolConnection(worker))
+        except Exception as e:
+            logger.error(f"Could not open pool connection with client ID {client_id}: {e}")
+    execution_pool = ExecutionPool(connections)
+    logger.info(f"Execution pool: {len(connections)} connections (client IDs {', '.join(map(str, execution_pool.connections))})")
+    return execution_pool
+
+# Connection that trades a ticker: its shard of the execution pool, or the main connection
+def connection_for(ticker):
+    if execution_pool is not None:
+        return execution_pool.connection_for(ticker)
+    return main_connection
+
+# Every connection orders go through: the execution pool's, or just the main one
+def all_connections():
+    if execution_pool is not None:
+        return list(execution_pool.connections.values())
+    return [main_connection]
+
+# Working trades for a ticker on every connection, each paired with the connection of the client that
+# placed it. IB only lets the placing client cancel an order, and a ticker's orders can belong to another
+# client than its current shard (placed before the pool was opened or resized).
+def working_orders(ticker, order_types=None):
+    connections = {connection.client_id: connection for connection in all_connections()}
+    found = {}
+    for connection in connections.values():
+        for trade in connection.order_index.active(ticker, order_types):
+            owner = connections.get(trade.order.clientId, connection)
+            found.setdefault(trade.order.permId or id(trade), (owner, trade))
+    return list(found.values())
+
+# Trailing percent of the working TRAIL LIMIT order for a ticker on any connection, or None
+def working_trail_percent(ticker):
+    for _, trade in working_orders(ticker, ["TRAIL LIMIT"]):
+        return trade.order.trailingPercent
+    return None
+
+# Run (ticker, priority, job) triples in priority order, sharded across the execution pool when there is one
+def run_jobs(jobs):
+    if execution_pool is not None:
+        return ib.run(execution_pool.run_sharded(jobs))
+    return ib.run(run_prioritized(jobs))
+
+# Close the execution pool and the main connection
+def disconnect_ibkr():
+    global execution_pool
+    if execution_pool is not None:
+        execution_pool.disconnect()
+        execution_pool = None
+    else:
+        ib.disconnect()
 
 
 # Getter for excel_file path
@@ -36,6 +183,7 @@ def get_excel_file():
     return excel_file
 
 # Cancel all open orders
+@instrument("cancel_all")
 def cancel_all_open_orders():
     try:
         ib.reqGlobalCancel()
@@ -52,24 +200,97 @@ def cancel_all_open_orders():
     except Exception as e:
         logger.error(f"Error cancelling all open orders: {e}")
 
-# Get the latest market price using IBKR, fallback to Yahoo Finance if needed
+# Future resolved by the next emit of an event. The handler is connected before returning, so an emit
+# can't slip in between checking a condition and starting to wait (awaiting the event directly only
+# subscribes once the wrapping task first runs).
+def _next_emit(event):
+    future = asyncio.get_event_loop().create_future()
+
+    def on_emit(*args):
+        if not future.done():
+            future.set_result(args)
+
+    event.connect(on_emit)
+    future.add_done_callback(lambda _: event.disconnect(on_emit))
+    return future
+
+# Seconds to wait for each batch of price subscriptions before falling back
+PRICE_BATCH_TIMEOUT = 5
+
+# Subscribe contracts ({symbol: contract}) to streaming quotes in chunks that fit the line limit,
+# completing each symbol as its first tick after the request arrives
+async def _stream_prices_async(contracts, timeout, max_age=QUOTE_MAX_AGE):
+    prices = {}
+    items = list(contracts.items())
+    for start in range(0, len(items), quote_cache.max_lines):
+        chunk = dict(items[start:start + quote_cache.max_lines])
+        await quote_cache.subscribe_async(chunk, max_age)
+        pending = set(chunk)
+        deadline = time.monotonic() + timeout
+        while pending:
+            for symbol in list(pending):
+                price = quote_cache.price(symbol, max_age=None, fresh=True)
+                if price:
+                    prices[symbol] = price
+                    pending.discard(symbol)
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(_next_emit(ib.updateEvent), remaining)
+            except asyncio.TimeoutError:
+                pass
+    return prices
+
+# Get the latest market prices for many tickers. Fresh streaming quotes are read from memory, the rest
+# are subscribed in one paced burst and completed as their ticks arrive; anything still missing after
+# the batch timeout falls back to Yahoo Finance
+@instrument("price")
+def get_market_prices(tickers, timeout=PRICE_BATCH_TIMEOUT, max_age=QUOTE_MAX_AGE):
+    symbols = list(dict.fromkeys(str(t).strip().upper() for t in tickers if isinstance(t, str) and t.strip()))
+    prices = {}
+    for symbol in symbols:
+        price = quote_cache.price(symbol, max_age)
+        if price:
+            prices[symbol] = price
+    cached = len(prices)
+
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if missing:
+        try:
+            contracts = warm_contract_cache(missing)
+            prices.update(ib.run(_stream_prices_async(contracts, timeout, max_age)))
+        except Exception as e:
+            logger.warning(f"IBKR batch price fetch failed: {e}")
+
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if missing:
+        logger.warning(f"IBKR price fetch failed for {', '.join(missing)}, falling back to Yahoo Finance")
+        prices.update(yahoo_bars.closes(missing))
+
+    logger.info(f"Priced {len(prices)}/{len(symbols)} tickers ({cached} from the quote cache)")
+    return prices
+
+# Qualify tickers and start their quote subscriptions without waiting for ticks, so a later
+# get_market_prices for them is served from the quote cache
+def prefetch_quotes(tickers):
+    contracts = warm_contract_cache(tickers)
+    ib.run(quote_cache.subscribe_async(contracts))
+    return contracts
+
+# Latest streaming last/bid/ask/close for a ticker, or None if it is not subscribed or older than max_age
+def get_quote(ticker, max_age=QUOTE_MAX_AGE):
+    return quote_cache.quote(ticker, max_age)
+
+# Get the latest market price for one ticker
 def get_market_price(ticker):
-    try:
-        contract = Stock(ticker, "SMART", "USD")
-        ib.qualifyContracts(contract)
-        market_data = ib.reqMktData(contract, snapshot=True)
-        ib.sleep(1)
-        price = market_data.last if market_data.last else (market_data.close or market_data.ask or market_data.bid)
-        if price and price > 0:
-            return price
-        raise ValueError("No valid IBKR price")
-    except Exception as e:
-        logger.warning(f"IBKR price fetch failed for {ticker}, falling back to Yahoo Finance: {e}")
-        stock_info = yf.Ticker(ticker)
-        return stock_info.history(period="1d")["Close"].iloc[-1]
+    price = get_market_prices([ticker]).get(str(ticker).strip().upper())
+    if price is None:
+        raise ValueError(f"No market price available for {ticker}")
+    return price
 
-# Return a qualified IB contract for the given ticker
-def qualify_contract(ticker):
+# Build an unqualified IB stock contract for the given ticker
+def _make_contract(ticker):
     # Handle IBKR-specific symbols like BRK.B or BF.B
     if "." in ticker:
         contract = Stock(ticker.replace(".", " "), "SMART", "USD")
@@ -77,34 +298,169 @@ def qualify_contract(ticker):
         contract.localSymbol = ticker
     else:
         contract = Stock(ticker, "SMART", "USD")
+    return contract
 
-    ib.qualifyContracts(contract)
+# Load the on-disk contract cache once, dropping entries older than the TTL
+def _load_contract_cache():
+    global _contract_cache
+    if _contract_cache is None:
+        try:
+            with open(CONTRACT_CACHE_FILE, "r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            entries = {}
+        now = time.time()
+        _contract_cache = {
+            symbol: entry for symbol, entry in entries.items()
+            if now - entry.get("qualified_at", 0) < CONTRACT_CACHE_TTL
+        }
+    return _contract_cache
+
+# Persist the contract cache, replacing the file in one step
+def _save_contract_cache():
+    temp_file = f"{CONTRACT_CACHE_FILE}.tmp"
+    try:
+        with open(temp_file, "w") as file:
+            json.dump(_contract_cache, file, indent=2)
+        os.replace(temp_file, CONTRACT_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Could not save contract cache: {e}")
+
+# Rebuild a qualified contract from a cache entry
+def _contract_from_cache(entry):
+    contract = Stock(entry["symbol"], "SMART", "USD", primaryExchange=entry["primaryExchange"])
+    contract.conId = entry["conId"]
+    contract.localSymbol = entry["localSymbol"]
     return contract
 
-# Place a GTC market order through IB
-def place_market_order(contract, action, quantity):
+# Qualify every ticker not already cached in one batch and store the results
+@instrument("qualify")
+def warm_contract_cache(tickers):
+    cache = _load_contract_cache()
+    symbols = list(dict.fromkeys(str(t).strip().upper() for t in tickers if isinstance(t, str) and t.strip()))
+    missing = [symbol for symbol in symbols if symbol not in cache]
+    if missing:
+        contracts = [_make_contract(symbol) for symbol in missing]
+        ib.qualifyContracts(*contracts)
+        now = time.time()
+        for symbol, contract in zip(missing, contracts):
+            if contract.conId:
+                cache[symbol] = {
+                    "conId": contract.conId,
+                    "symbol": contract.symbol,
+                    "localSymbol": contract.localSymbol,
+                    "primaryExchange": contract.primaryExchange,
+                    "qualified_at": now,
+                }
+            else:
+                logger.warning(f"Could not qualify contract for {symbol}")
+        _save_contract_cache()
+        logger.info(f"Qualified {len(missing)} contracts ({len(symbols) - len(missing)} from cache)")
+    return {symbol: _contract_from_cache(cache[symbol]) for symbol in symbols if symbol in cache}
+
+# Return a qualified IB contract for the given ticker, using the contract cache when possible
+def qualify_contract(ticker):
+    symbol = str(ticker).strip().upper()
+    contract = warm_contract_cache([symbol]).get(symbol)
+    if contract is None:
+        logger.warning(f"{symbol}: contract not qualified, using unqualified contract")
+        contract = _make_contract(symbol)
+    return contract
+
+# Request the bars a symbol is missing from the bar store and merge them in
+async def _fill_bars_async(symbol, contract, now):
+    duration = bar_store.missing_duration(symbol, now)
+    await ib_pacer.acquire()
+    bars = await ib.reqHistoricalDataAsync(
+        contract, endDateTime="", durationStr=duration, barSizeSetting=bar_store.bar_size,
+        whatToShow="TRADES", useRTH=True, formatDate=1,
+    )
+    if not bars:
+        logger.warning(f"{symbol}: no historical bars returned for {duration}")
+        return
+    bar_store.append(symbol, bars_frame(bars))
+
+# Bring the bar store up to date for many tickers: symbols holding the last session's bar are
+# skipped, the rest fetch only the days since their last stored bar
+@instrument("history")
+def fill_bar_store(tickers):
+    now = pd.Timestamp.now(tz=MARKET_TZ)
+    contracts = warm_contract_cache(tickers)
+    stale = {symbol: contract for symbol, contract in contracts.items() if not bar_store.is_current(symbol, now)}
+    jobs = [(symbol, partial(_fill_bars_async, symbol, contract, now)) for symbol, contract in stale.items()]
+    if jobs:
+        ib.run(run_ordered_by_key(jobs, max_concurrency=HISTORICAL_MAX_CONCURRENT))
+    logger.info(f"📈 Bar store: {len(stale)} updated, {len(contracts) - len(stale)} already current")
+    return list(stale)
+
+# Order statuses that mean the broker has answered a placement, and the subset that means it was accepted
+ORDER_ACK_STATUSES = ("PreSubmitted", "Submitted", "Filled", "Cancelled", "ApiCancelled", "Inactive")
+ORDER_ACCEPTED_STATUSES = ("PreSubmitted", "Submitted", "Filled")
+ORDER_DONE_STATUSES = ("Filled", "Cancelled", "ApiCancelled", "Inactive")
+ORDER_ACK_TIMEOUT = 5  # seconds
+
+
+# Wait on a trade's status events until it reaches one of the given statuses or the deadline passes
+async def wait_for_status_async(trade, statuses, timeout=ORDER_ACK_TIMEOUT):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while trade.orderStatus.status not in statuses:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return False
+        try:
+            await asyncio.wait_for(_next_emit(trade.statusEvent), remaining)
+        except asyncio.TimeoutError:
+            pass
+    return True
+
+# Wait until the broker acknowledges a trade or the deadline passes, logging any rejection reason
+@instrument("ack", ticker="trade")
+async def wait_for_ack_async(trade, timeout=ORDER_ACK_TIMEOUT):
+    if not await wait_for_status_async(trade, ORDER_ACK_STATUSES, timeout):
+        logger.warning(f"{trade.contract.symbol}: no acknowledgement for order {trade.order.orderId} "
+                       f"after {timeout}s (status: {trade.orderStatus.status})")
+    reason = get_reject_reason(trade)
+    if reason:
+        logger.error(f"{trade.contract.symbol}: order {trade.order.orderId} rejected: {reason}")
+    return trade
+
+# Wait on a trade's status updates until the broker acknowledges it or the deadline passes
+def wait_for_ack(trade, timeout=ORDER_ACK_TIMEOUT):
+    return ib.run(wait_for_ack_async(trade, timeout))
+
+# True if the broker accepted the order
+def order_accepted(trade):
+    return trade.orderStatus.status in ORDER_ACCEPTED_STATUSES
+
+# Return the broker's reason for a rejected or cancelled order, or None if it was not rejected
+def get_reject_reason(trade):
+    if trade.orderStatus.status not in ("Cancelled", "ApiCancelled", "Inactive"):
+        return None
+    for entry in reversed(trade.log):
+        if entry.errorCode or entry.message:
+            return f"{entry.errorCode} {entry.message}".strip() if entry.errorCode else entry.message
+    return trade.orderStatus.status
+
+# Build a GTC market order
+def _market_order(action, quantity):
     order = MarketOrder(action, quantity)
     order.tif = "GTC"
     order.rthOnly = True
-    trade = ib.placeOrder(contract, order)
-    ib.sleep(1)
-    return trade
+    return order
 
-# Place a limit order through IB at market price + $0.50
-def place_limit_order(contract, action, quantity, market_price):
-    order = LimitOrder(
+# Build a GTC limit order at market price + $0.50
+def _limit_order(action, quantity, market_price):
+    return LimitOrder(
         action=action,
         totalQuantity=quantity,
         lmtPrice=round(market_price + 0.50, 2),
         tif="GTC",
         outsideRth=True
     )
-    trade = ib.placeOrder(contract, order)
-    ib.sleep(1)
-    return trade
 
-# Attach a trailing limit order with given offset and percent to a contract
-def attach_trailing_limit(contract, action, quantity, market_price, trail_limit_percent):
+# Build the trailing limit order that protects a position opened with the given action
+def _trailing_limit_order(action, quantity, market_price, trail_limit_percent):
     reverse_action = "SELL" if action == "BUY" else "BUY"
     trail_stop_price = round(
         market_price * (1 - trail_limit_percent / 100)
@@ -112,7 +468,7 @@ def attach_trailing_limit(contract, action, quantity, market_price, trail_limit_
         else market_price * (1 + trail_limit_percent / 100),
         2,
     )
-    trailing_order = Order(
+    return Order(
         action=reverse_action,
         orderType="TRAIL LIMIT",
         totalQuantity=quantity,
@@ -122,66 +478,284 @@ def attach_trailing_limit(contract, action, quantity, market_price, trail_limit_
         tif="GTC",
         outsideRth=True,
     )
-    trailing_trade = ib.placeOrder(contract, trailing_order)
-    ib.sleep(1)
-    return trailing_trade
 
-# Cancel existing LMT or TRAIL LIMIT orders for a ticker
+# Place a single order within the message-rate limit and wait for its acknowledgement
+async def place_order_async(contract, order):
+    connection = connection_for(contract.symbol)
+    order.orderRef = order.orderRef or current_order_ref.get() or ""
+    with timed("place", contract.symbol):
+        await connection.pacer.acquire()
+        trade = connection.ib.placeOrder(contract, order)
+    return await wait_for_ack_async(trade)
+
+# Place many independent orders in one paced burst and wait for all acknowledgements
+async def place_orders_async(orders):
+    return await asyncio.gather(*(place_order_async(contract, order) for contract, order in orders))
+
+def place_orders(orders):
+    return ib.run(place_orders_async(orders))
+
+# Place a GTC market order through IB
+async def place_market_order_async(contract, action, quantity):
+    return await place_order_async(contract, _market_order(action, quantity))
+
+def place_market_order(contract, action, quantity):
+    return ib.run(place_market_order_async(contract, action, quantity))
+
+# Place a limit order through IB at market price + $0.50
+async def place_limit_order_async(contract, action, quantity, market_price):
+    return await place_order_async(contract, _limit_order(action, quantity, market_price))
+
+def place_limit_order(contract, action, quantity, market_price):
+    return ib.run(place_limit_order_async(contract, action, quantity, market_price))
+
+# Attach a trailing limit order with given offset and percent to a contract
+async def attach_trailing_limit_async(contract, action, quantity, market_price, trail_limit_percent):
+    trailing_order = _trailing_limit_order(action, quantity, market_price, trail_limit_percent)
+    return await place_order_async(contract, trailing_order)
+
+def attach_trailing_limit(contract, action, quantity, market_price, trail_limit_percent):
+    return ib.run(attach_trailing_limit_async(contract, action, quantity, market_price, trail_limit_percent))
+
+# Submit an entry order (MKT or LMT) and its protective trailing limit as one linked parent/child group.
+# The parent is held with transmit=False and released together with the child, so the gateway gets both
+# in one burst and the position is never left without its trailing limit.
+async def place_bracket_order_async(contract, action, quantity, market_price, trail_limit_percent, entry_type="MKT", trail_price=None):
+    if entry_type == "LMT":
+        parent = _limit_order(action, quantity, market_price)
+    else:
+        parent = _market_order(action, quantity)
+    connection = connection_for(contract.symbol)
+    parent.orderId = connection.ib.client.getReqId()
+    parent.transmit = False
+
+    child = _trailing_limit_order(action, quantity, trail_price or market_price, trail_limit_percent)
+    child.parentId = parent.orderId
+    child.transmit = True
+    parent.orderRef = child.orderRef = current_order_ref.get() or ""
+
+    with timed("place", contract.symbol):
+        await connection.pacer.acquire(2)
+        parent_trade = connection.ib.placeOrder(contract, parent)
+        trailing_trade = connection.ib.placeOrder(contract, child)
+    await asyncio.gather(wait_for_ack_async(parent_trade), wait_for_ack_async(trailing_trade))
+    return parent_trade, trailing_trade
+
+def place_bracket_order(contract, action, quantity, market_price, trail_limit_percent, entry_type="MKT", trail_price=None):
+    return ib.run(place_bracket_order_async(
+        contract, action, quantity, market_price, trail_limit_percent, entry_type, trail_price
+    ))
+
+# Cancels in flight per symbol; a cancel requested while one is running joins it
+_cancels_in_flight = {}
+
+async def _cancel_orders_async(ticker):
+    working = working_orders(ticker, ["LMT", "TRAIL LIMIT"])
+    # Orders whose cancel is already on its way are waited for, not cancelled a second time
+    to_cancel = [(connection, trade) for connection, trade in working if trade.orderStatus.status != "PendingCancel"]
+    for connection, trade in to_cancel:
+        await connection.pacer.acquire(priority=PRIORITY_CANCEL)
+        connection.ib.cancelOrder(trade.order)
+    if len(to_cancel) < len(working):
+        logger.info(f"{ticker}: {len(working) - len(to_cancel)} cancel(s) already pending, not resent")
+    trades = [trade for _, trade in working]
+    await asyncio.gather(*(wait_for_status_async(trade, ORDER_DONE_STATUSES) for trade in trades))
+    return trades
+
+# Cancel existing LMT or TRAIL LIMIT orders for a ticker and wait for the cancels to be confirmed.
+# Each order is cancelled through the client that placed it, whichever shard the ticker maps to now.
+# Cancels are paced ahead of other messages, and concurrent cancels for one ticker share one request.
+@instrument("cancel", ticker="ticker")
+async def cancel_existing_orders_async(ticker):
+    key = normalize_symbol(ticker)
+    task = _cancels_in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_cancel_orders_async(ticker))
+        _cancels_in_flight[key] = task
+        task.add_done_callback(lambda _: _cancels_in_flight.pop(key, None))
+    else:
+        logger.info(f"{ticker}: joining the cancel already in flight")
+    return await asyncio.shield(task)
+
 def cancel_existing_orders(ticker):
-    ib.reqOpenOrders()
-    ib.sleep(0.5)
-    for trade in ib.trades():
-        if trade.contract.symbol == ticker and trade.order.orderType in ["LMT", "TRAIL LIMIT"]:
-            if trade.orderStatus.status not in ["Cancelled", "Filled"]:
-                ib.cancelOrder(trade.order)
-                ib.sleep(0.5)
+    return ib.run(cancel_existing_orders_async(ticker))
 
 # Check current holdings for a ticker
 def get_remaining_quantity(ticker):
-    ib.sleep(1)
-    for pos in ib.portfolio():
-        if pos.contract.symbol == ticker and pos.contract.secType == "STK":
-            return pos.position
-    return 0
+    return position_cache.get(ticker)
 
-# Add trailing limit stop loss to all or specified stocks
+# Wait until a ticker's position reflects a fill, returning the settled quantity
+@instrument("position_settle", ticker="ticker")
+async def wait_for_position_async(ticker, expected, timeout=POSITION_SETTLE_TIMEOUT):
+    return await position_cache.settled_async(ticker, expected, timeout=timeout)
+
+# Add trailing limit stop loss to all or specified stocks. Each holding's existing orders are cancelled
+# and its trailing limit placed as one job, scheduled at the protective priority under its own intent.
+@instrument("holdings_trail")
 def add_trailing_limit_to_holdings(trail_limit_percent=2.5, side="SELL", tickers=[]):
-    for pos in ib.portfolio():
-        if pos.contract.secType == "STK" and pos.position > 0:
-            symbol = pos.contract.symbol
-            if tickers and symbol not in tickers:
-                continue
-            logger.info(f"[TRAIL-ATTACH] {symbol}: Replacing existing limit/trailing orders.")
-            cancel_existing_orders(symbol)
-            price = get_market_price(symbol)
-            contract = qualify_contract(symbol)
-            action = side.upper()
-            trail_stop_price = round(
-                price * (1 - trail_limit_percent / 100)
-                if action == "SELL"
-                else price * (1 + trail_limit_percent / 100),
-                2
-            )
-            trailing_order = Order(
-                action=action,
-                orderType="TRAIL LIMIT",
-                totalQuantity=int(pos.position),
-                trailingPercent=trail_limit_percent,
-                trailStopPrice=trail_stop_price,
-                lmtPriceOffset=0.10,
-                tif="GTC",
-                outsideRth=True
-            )
-            trade = ib.placeOrder(contract, trailing_order)
-            ib.sleep(1)
-            logger.info(f"[TRAIL-ATTACH] {symbol}: Trailing limit placed at {trail_limit_percent}% for {int(pos.position)} shares.")
+    positions = [
+        pos for pos in ib.portfolio()
+        if pos.contract.secType == "STK" and pos.position > 0
+        and (not tickers or pos.contract.symbol in tickers)
+    ]
+    prices = get_market_prices([pos.contract.symbol for pos in positions])
+    contracts = warm_contract_cache([pos.contract.symbol for pos in positions])
+    jobs = []  # (intent key, symbol, job)
+    for pos in positions:
+        symbol = pos.contract.symbol
+        price = prices.get(symbol.upper())
+        if price is None:
+            logger.error(f"[TRAIL-ATTACH] {symbol}: No market price, skipping.")
+            continue
+        action = "BUY" if side.upper() == "SELL" else "SELL"  # side of the position the trailing limit protects
+        order = _trailing_limit_order(action, int(pos.position), price, trail_limit_percent)
+        job = partial(_replace_trailing_limit_async, contracts.get(symbol.upper()), symbol, order)
+        key = intent_key("holdings_trail", symbol, side, int(pos.position), trail_limit_percent)
+        jobs.append((key, symbol, job))
+
+    refs, recovered = resolve_intents([key for key, _, _ in jobs])
+    for key, symbol, _ in jobs:
+        if key in recovered:
+            logger.info(f"[TRAIL-ATTACH] {symbol}: Trailing limit already placed as {refs[key]}, skipping.")
+    run_jobs([
+        (symbol, PRIORITY_PROTECT, partial(run_intent_async, refs[key], job, "holdings_trail", symbol, side.upper(), "TRAIL LIMIT"))
+        for key, symbol, job in jobs if key not in recovered
+    ])
+    close_intents(refs.values())
+
+# Replace a holding's limit and trailing orders with the given trailing limit
+async def _replace_trailing_limit_async(contract, symbol, order):
+    if contract is None:
+        logger.error(f"[TRAIL-ATTACH] {symbol}: Contract could not be qualified, skipping.")
+        return
+    logger.info(f"[TRAIL-ATTACH] {symbol}: Replacing existing limit/trailing orders.")
+    await cancel_existing_orders_async(symbol)
+    trade = await place_order_async(contract, order)
+    if order_accepted(trade):
+        logger.info(f"[TRAIL-ATTACH] {symbol}: Trailing limit placed at {order.trailingPercent}% for {int(order.totalQuantity)} shares.")
+
+# Open a workbook session so every sheet update and log row of a run is written in one save
+@instrument("excel_read")
+def open_workbook_session():
+    global workbook_session
+    workbook_session = WorkbookSession(excel_file)
+    return workbook_session
+
+# Write everything staged in the open workbook session and close it
+@instrument("excel_write")
+def commit_workbook_session():
+    global workbook_session
+    if workbook_session is not None:
+        try:
+            workbook_session.commit()
+            close_intents(_unsaved_intents)
+        except PermissionError:
+            logger.error(f"❌ Permission denied: Please close the file '{excel_file}' and try again.")
+            raise
+        except WorkbookChangedError as e:
+            logger.error(f"❌ {e}; the sheet updates of this run were not saved.")
+            raise
+        finally:
+            workbook_session = None
+            _unsaved_intents.clear()
+
+# Read all sheets, from the open session when there is one
+def read_workbook():
+    if workbook_session is not None:
+        return workbook_session.read()
+    with timed("excel_read"):
+        return pd.read_excel(excel_file, sheet_name=None)
 
 # Update sheet in Excel
 def update_sheet_in_excel(sheet_name, df):
-    with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='overlay') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
+    if workbook_session is not None:
+        workbook_session.update_sheet(sheet_name, df)
+        return
+    with timed("excel_write"), WorkbookSession(excel_file) as session:
+        session.update_sheet(sheet_name, df)
+
+# Open the trade journal on first use
+def get_journal():
+    global _journal
+    if _journal is None:
+        _journal = TradeJournal(journal_file)
+    return _journal
+
+# Open the order intent log on first use (it lives in the trade journal database)
+def get_intent_log():
+    global _intent_log
+    if _intent_log is None:
+        _intent_log = IntentLog(journal_file)
+    return _intent_log
+
+# orderRefs of every open order and of today's executions at the broker, across all clients
+@instrument("reconcile")
+def broker_order_refs():
+    refs = {trade.order.orderRef for trade in ib.reqAllOpenOrders()}
+    for connection in all_connections():
+        refs.update(fill.execution.orderRef for fill in connection.ib.reqExecutions())
+        refs.update(trade.order.orderRef for trade in connection.ib.trades())
+    refs.discard("")
+    refs.discard(None)
+    return refs
+
+# Decide per unit of work (intent key) the orderRef to send it under, and whether it already went out.
+# The latest attempt of a key counts as sent while it is sent but not yet closed (the run stopped before
+# saving its outcome), or when it is pending or failed but its ref is at the broker (a run that stopped
+# mid-submission, or an ack that came after the timeout). Anything else is due under a new attempt, so a
+# row transmitted again after its outcome was saved is sent again. Returns ({key: ref}, recovered keys).
+def resolve_intents(intent_keys):
+    intents = get_intent_log()
+    latest = intents.latest(intent_keys)
+    unresolved = [ref for ref, state, _ in latest.values() if state in (INTENT_PENDING, INTENT_FAILED)]
+    at_broker = broker_order_refs() if unresolved else set()
+    refs, recovered = {}, set()
+    for key in intent_keys:
+        ref, state, attempt = latest.get(key, (None, None, 0))
+        if state == INTENT_SENT or (state in (INTENT_PENDING, INTENT_FAILED) and ref in at_broker):
+            if state != INTENT_SENT:
+                intents.finish(ref, INTENT_SENT)
+            recovered.add(key)
+        else:
+            if state == INTENT_PENDING:
+                intents.finish(ref, INTENT_FAILED)
+            ref = intent_ref(key, attempt + 1)
+        refs[key] = ref
+    if unresolved:
+        logger.info(f"Reconciled {len(unresolved)} pending or failed intents: "
+                    f"{sum(ref in at_broker for ref in unresolved)} were at the broker")
+    return refs, recovered
+
+# Close sent intents whose outcome has been saved
+def close_intents(order_refs):
+    if order_refs:
+        get_intent_log().close_sent(order_refs)
+
+# Close sent intents once the workbook holding their outcome is saved: when the open session is
+# committed, or right away when there is no session (the sheets were written directly)
+def close_intents_on_save(order_refs):
+    if workbook_session is not None:
+        _unsaved_intents.update(order_refs)
+    else:
+        close_intents(order_refs)
+
+# Run one unit of order work under a write-ahead intent: the intent is logged as pending, every order
+# the job places carries order_ref, and the intent is marked sent if the broker accepted any of them
+async def run_intent_async(order_ref, job, source, symbol, action, order_type, quantity=None):
+    intents = get_intent_log()
+    intents.begin(order_ref, source, symbol, action, order_type, quantity)
+    token = current_order_ref.set(order_ref)
+    try:
+        return await job()
+    finally:
+        current_order_ref.reset(token)
+        sent = any(
+            trade.order.orderRef == order_ref and trade.orderStatus.status in ORDER_ACCEPTED_STATUSES
+            for trade in connection_for(symbol).ib.trades()
+        )
+        intents.finish(order_ref, INTENT_SENT if sent else INTENT_FAILED)
 
-# Append an entry to the "Log" sheet to track order activity
+# Record an order in the append-only trade journal; the Log sheet is produced by export_log_sheet
 def append_to_log(symbol, action, quantity, price):
     log_entry = {
         "Date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -190,18 +764,27 @@ def append_to_log(symbol, action, quantity, price):
         "Quantity": quantity,
         "Price": round(quantity * price, 2),
     }
-    try:
-        existing_log = pd.read_excel(excel_file, sheet_name="Log")
-        updated_log = pd.concat([existing_log, pd.DataFrame([log_entry])], ignore_index=True)
-    except Exception:
-        updated_log = pd.DataFrame([log_entry])
-
-    with pd.ExcelWriter(excel_file, engine="openpyxl", mode="a", if_sheet_exists="overlay") as writer:
-        updated_log.to_excel(writer, sheet_name="Log", index=False)
-
-# Update BUY_USUAL and SELL sheets based on holdings
+    get_journal().record(log_entry)
+
+# Materialize the journal (or a date range of it, YYYY-MM-DD) into a sheet of the workbook
+def export_log_sheet(start=None, end=None, sheet_name="Log"):
+    journal = get_journal()
+    sheets = read_workbook()
+    if "Log" in sheets:
+        journal.import_log_sheet(sheets["Log"])
+    log_df = journal.to_frame(start, end)
+    update_sheet_in_excel(sheet_name, log_df)
+    logger.info(f"Exported {len(log_df)} journal rows to sheet '{sheet_name}'")
+    return log_df
+
+# Trailing percent placed on holdings that have no working trail limit
+DEFAULT_HOLDING_TRAIL_PERCENT = 5.0
+
+# Update BUY_USUAL and SELL sheets based on holdings in a single pass: one price snapshot,
+# one open-order lookup and one merge per sheet, with protective orders sent in one burst at the end
+@instrument("orders_page")
 def update_orders_page(Trading_Mode):
-    sheets = pd.read_excel(excel_file, sheet_name=None)
+    sheets = read_workbook()
 
     # Enforce correct dtypes
     dtype_mapping = {
@@ -220,40 +803,19 @@ def update_orders_page(Trading_Mode):
                     df[col] = df[col].astype(dtype, errors='ignore')
             sheets[sheet_name] = df
 
-    holdings = {pos.contract.symbol: pos.position for pos in ib.portfolio() if pos.contract.secType == "STK"}
+    # One snapshot of holdings, prices and working trail limits for the whole sync
+    holdings = pd.DataFrame(
+        [(pos.contract.symbol.upper(), pos.position) for pos in ib.portfolio() if pos.contract.secType == "STK"],
+        columns=["Ticker", "Quantity"],
+    ).drop_duplicates("Ticker", keep="last").set_index("Ticker")
+    prices = get_market_prices(holdings.index.tolist())
+    contracts = warm_contract_cache(holdings.index.tolist())
+    holdings["Price"] = holdings.index.map(prices)
+    holdings["TrailLimit%"] = holdings.index.map(working_trail_percent)
+    for symbol in holdings.index[holdings["Price"].isna()]:
+        logger.error(f"[ORDERS-PAGE] {symbol}: No market price, leaving its row as it is.")
 
-    # Helper: Find existing TrailLimit% if any
-    def get_existing_trail_percent(symbol):
-        ib.reqOpenOrders()
-        ib.sleep(1)
-        for trade in ib.trades():
-            if (trade.contract.symbol == symbol 
-                and trade.order.orderType == "TRAIL LIMIT" 
-                and trade.orderStatus.status not in ["Cancelled", "Filled"]):
-                return trade.order.trailingPercent
-        return None
-
-    # Helper: Place a new trail limit order
-    def place_trailing_limit(symbol, quantity, action, trail_percent):
-        contract = qualify_contract(symbol)
-        trail_stop_price = round(
-            get_market_price(symbol) * (1 - trail_percent / 100)
-            if action == "SELL"
-            else get_market_price(symbol) * (1 + trail_percent / 100),
-            2
-        )
-        order = Order(
-            action=action,
-            orderType="TRAIL LIMIT",
-            totalQuantity=int(quantity),
-            trailingPercent=trail_percent,
-            trailStopPrice=trail_stop_price,
-            lmtPriceOffset=0.10,
-            tif="GTC",
-            outsideRth=True
-        )
-        ib.placeOrder(contract, order)
-        ib.sleep(1)
+    protective_orders = []
 
     def sync_sheet(sheet_name, action):
         df = sheets.get(sheet_name, pd.DataFrame())
@@ -267,51 +829,58 @@ def update_orders_page(Trading_Mode):
                 "Status": pd.Series(dtype='str'),
                 "Execution": pd.Series(dtype='str')
             })
-        tickers_in_sheet = set(df["Ticker"].astype(str).str.upper())
-        updated_tickers = set()
 
-        for symbol, qty in holdings.items():
-            if action == "BUY" and qty <= 0:
-                continue
-            if action == "SELL" and qty > 0:
-                continue
+        side = holdings[holdings["Quantity"] > 0] if action == "BUY" else holdings[holdings["Quantity"] <= 0]
 
-            price = get_market_price(symbol)
-            trail_limit_percent = get_existing_trail_percent(symbol)
-
-            if trail_limit_percent is None:
-                # No existing trail limit order, place one with 5%
-                default_trail = 5.0
-                order_action = "SELL" if action == "BUY" else "BUY"
-                place_trailing_limit(symbol, qty, order_action, default_trail)
-                trail_limit_percent = default_trail
-
-            update_data = {
-                "Amount": math.ceil(qty * price),
-                "Quantity": qty,
-                "TrailLimit%": trail_limit_percent,
-                "Status": "Open",
-                "Execution": " ",
-                "OrderType": "MKT-ATCH-LIMIT"
-            }
-
-            updated_tickers.add(symbol)
-
-            if symbol in tickers_in_sheet:
-                for col, val in update_data.items():
-                    df.loc[df["Ticker"].str.upper() == symbol, col] = val
+        # Holdings without a working trail limit get one at the default percent, placed after both sheets are synced
+        missing_trail = side["TrailLimit%"].isna()
+        for symbol, row in side[missing_trail].iterrows():
+            if not row["Quantity"]:
+                continue
+            if pd.isna(row["Price"]):
+                logger.error(f"[ORDERS-PAGE] {symbol}: No market price, no trailing limit placed.")
+            elif symbol not in contracts:
+                logger.error(f"[ORDERS-PAGE] {symbol}: Contract could not be qualified, no trailing limit placed.")
             else:
-                df = pd.concat([df, pd.DataFrame([{"Ticker": symbol, **update_data}])], ignore_index=True)
-
+                order = _trailing_limit_order(action, abs(int(row["Quantity"])), float(row["Price"]), DEFAULT_HOLDING_TRAIL_PERCENT)
+                protective_orders.append((contracts[symbol], order))
+
+        # Rows are rewritten only for priced holdings; an unpriced holding keeps its row as it is but still
+        # counts as held below
+        priced = side.dropna(subset=["Price"])
+        update = pd.DataFrame({
+            "Amount": (priced["Quantity"] * priced["Price"]).apply(math.ceil),
+            "Quantity": priced["Quantity"],
+            "TrailLimit%": priced["TrailLimit%"].fillna(DEFAULT_HOLDING_TRAIL_PERCENT),
+            "Status": "Open",
+            "Execution": " ",
+            "OrderType": "MKT-ATCH-LIMIT",
+        }, index=priced.index)
+
+        keys = df["Ticker"].astype(str).str.upper()
+        matched = keys.isin(update.index)
+        for col in update.columns:
+            if col not in df.columns:
+                df[col] = pd.Series(dtype=object)
+            df[col] = df[col].astype(object)
+            df.loc[matched, col] = keys[matched].map(update[col])
+        new_rows = update[~update.index.isin(keys)].rename_axis("Ticker").reset_index()
+        df = pd.concat([df, new_rows], ignore_index=True)
+
+        keys = df["Ticker"].astype(str).str.upper()
         if Trading_Mode == "Paper":
-            df = df[df["Ticker"].str.upper().isin(updated_tickers)]
+            df = df[keys.isin(side.index)]
         else:
-            for symbol in tickers_in_sheet:
-                if symbol not in updated_tickers:
-                    for col, val in zip(["Amount", "Quantity", "TrailLimit%", "OrderType", "Status", "Execution"], [2000, " ", 5.0, "MKT-ATCH-LIMIT", "", ""]):
-                        df.loc[df["Ticker"].str.upper() == symbol, col] = val
+            stale = ~keys.isin(side.index)
+            for col, val in zip(["Amount", "Quantity", "TrailLimit%", "OrderType", "Status", "Execution"], [2000, " ", 5.0, "MKT-ATCH-LIMIT", "", ""]):
+                df.loc[stale, col] = val
 
         update_sheet_in_excel(sheet_name, df)
 
     sync_sheet("BUY_Usual", "BUY")
     sync_sheet("SELL", "SELL")
+
+    if protective_orders:
+        trades = place_orders(protective_orders)
+        placed = sum(order_accepted(trade) for trade in trades)
+        logger.info(f"[ORDERS-PAGE] Placed {placed}/{len(trades)} trailing limits at {DEFAULT_HOLDING_TRAIL_PERCENT}%")
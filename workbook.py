@@ -0,0 +1,113 @@
+import io
+import os
+import logging
+import tempfile
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.dataframe import dataframe_to_rows
+
+logger = logging.getLogger(__name__)
+
+# Convert a DataFrame value into something openpyxl can store
+def _cell_value(value):
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+# The workbook was saved by someone else during a session and a sheet the session changed was edited too
+class WorkbookChangedError(Exception):
+    pass
+
+# Unit of work over the orders workbook: the file is read once, sheet updates are
+# collected in memory, and everything is written back in a single save that replaces the file
+# only after the new copy has been fully written. If the file is saved by someone else while the session
+# is open, their changes are kept: staged sheets are reapplied on top of the new file, unless one of
+# those sheets was edited as well, in which case nothing is written.
+class WorkbookSession:
+    def __init__(self, path):
+        self.path = path
+        self._load()
+        self._dirty = set()
+
+    def _load(self):
+        self._mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "rb") as file:
+            self._data = file.read()
+        self.sheets = pd.read_excel(io.BytesIO(self._data), sheet_name=None)
+        self._loaded = {sheet_name: df.copy() for sheet_name, df in self.sheets.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.commit()
+
+    # All sheets as loaded, with any pending updates applied
+    def read(self):
+        return dict(self.sheets)
+
+    # Stage a full replacement of one sheet
+    def update_sheet(self, sheet_name, df):
+        self.sheets[sheet_name] = df
+        self._dirty.add(sheet_name)
+
+    # Take in a save made by someone else since the session was opened, keeping the staged sheets
+    def _rebase(self):
+        staged = {sheet_name: self.sheets[sheet_name] for sheet_name in self._dirty}
+        loaded = self._loaded
+        self._load()
+        conflicts = [
+            sheet_name for sheet_name in staged
+            if sheet_name in loaded and not self.sheets.get(sheet_name, pd.DataFrame()).equals(loaded[sheet_name])
+        ]
+        if conflicts:
+            self.sheets.update(staged)
+            raise WorkbookChangedError(
+                f"{self.path} was saved during the run and sheet(s) {', '.join(sorted(conflicts))} changed; not overwriting them"
+            )
+        self.sheets.update(staged)
+        logger.warning(f"{self.path} was saved during the run; keeping those changes and reapplying {', '.join(sorted(staged))}")
+
+    # Write all staged changes in one save, replacing the workbook atomically
+    def commit(self):
+        if not self._dirty:
+            return
+        if os.stat(self.path).st_mtime_ns != self._mtime:
+            self._rebase()
+
+        workbook = load_workbook(io.BytesIO(self._data))
+        for sheet_name in self._dirty:
+            if sheet_name in workbook.sheetnames:
+                sheet = workbook[sheet_name]
+                sheet.delete_rows(1, sheet.max_row)
+            else:
+                sheet = workbook.create_sheet(sheet_name)
+            for r_idx, row in enumerate(dataframe_to_rows(self.sheets[sheet_name], index=False, header=True), 1):
+                for c_idx, value in enumerate(row, 1):
+                    sheet.cell(row=r_idx, column=c_idx, value=_cell_value(value))
+
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        data = buffer.getvalue()
+
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(suffix=".xlsx", dir=folder)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._data = data
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self._loaded = pd.read_excel(io.BytesIO(data), sheet_name=None)
+        logger.info(f"Saved {len(self._dirty)} sheet(s) to {self.path}: {', '.join(sorted(self._dirty))}")
+        self._dirty = set()
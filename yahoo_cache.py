@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Daily bars fetched from Yahoo Finance are kept on disk so repeated lookups in a session or day are free
+YAHOO_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yahoo_daily_bars.json")
+
+# While the market is open a cached close is only trusted for this long (seconds)
+YAHOO_INTRADAY_MAX_AGE = 15 * 60
+
+MARKET_TZ = "America/New_York"
+
+# Default HTTP layer: one batched yfinance download for all tickers, returning the Close frame
+def yahoo_download(tickers):
+    import yfinance as yf
+    data = yf.download(tickers, period="5d", interval="1d", progress=False, threads=True, auto_adjust=False)
+    closes = data["Close"]
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(name=tickers[0])
+    return closes
+
+# True while the regular US session is open
+def market_is_open(now):
+    return now.weekday() < 5 and (9, 30) <= (now.hour, now.minute) < (16, 0)
+
+# Time of the most recent regular-session close at or before now
+def last_session_close(now):
+    close = now.normalize() + pd.Timedelta(hours=16)
+    if close > now:
+        close -= pd.Timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= pd.Timedelta(days=1)
+    return close
+
+# On-disk cache of the latest daily close per symbol, filled by batched Yahoo downloads.
+# A cached close is fresh while the market is open for YAHOO_INTRADAY_MAX_AGE, and outside
+# market hours for as long as it was fetched after the last session close.
+class DailyBarCache:
+    def __init__(self, path=YAHOO_CACHE_FILE, downloader=yahoo_download):
+        self.path = path
+        self.downloader = downloader
+        self._bars = None
+
+    def _load(self):
+        if self._bars is None:
+            try:
+                with open(self.path, "r") as file:
+                    self._bars = json.load(file)
+            except (OSError, ValueError):
+                self._bars = {}
+        return self._bars
+
+    def _save(self):
+        temp_file = f"{self.path}.tmp"
+        try:
+            with open(temp_file, "w") as file:
+                json.dump(self._bars, file, indent=2)
+            os.replace(temp_file, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save Yahoo bar cache: {e}")
+
+    def _is_fresh(self, bar, now):
+        fetched = pd.Timestamp(bar["fetched_at"], unit="s", tz="UTC").tz_convert(MARKET_TZ)
+        if market_is_open(now):
+            return (now - fetched).total_seconds() < YAHOO_INTRADAY_MAX_AGE
+        return fetched >= last_session_close(now)
+
+    # Latest close per ticker, downloading every stale or missing ticker in one batch
+    def closes(self, tickers):
+        bars = self._load()
+        now = pd.Timestamp.now(tz=MARKET_TZ)
+        symbols = list(dict.fromkeys(tickers))
+        stale = [symbol for symbol in symbols if symbol not in bars or not self._is_fresh(bars[symbol], now)]
+
+        if stale:
+            try:
+                frame = self.downloader(stale)
+                fetched_at = time.time()
+                for symbol in stale:
+                    series = frame[symbol].dropna() if symbol in frame.columns else pd.Series(dtype=float)
+                    if series.empty:
+                        logger.error(f"Yahoo Finance returned no bars for {symbol}")
+                        continue
+                    bars[symbol] = {
+                        "date": str(pd.Timestamp(series.index[-1]).date()),
+                        "close": float(series.iloc[-1]),
+                        "fetched_at": fetched_at,
+                    }
+                self._save()
+            except Exception as e:
+                logger.error(f"Yahoo Finance batch download failed for {len(stale)} tickers: {e}")
+
+        logger.info(f"Yahoo fallback: {len(symbols) - len(stale)} cached, {len(stale)} downloaded")
+        return {symbol: bars[symbol]["close"] for symbol in symbols if symbol in bars}